@@ -1,7 +1,10 @@
 import json
+from collections import defaultdict
+from functools import partial
 
 from django.contrib import admin, messages
 from django.contrib.admin.views.decorators import staff_member_required
+from django.db import transaction
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import path, reverse
@@ -16,12 +19,20 @@ from .models import (
     LeagueStanding,
     Match,
     Player,
+    ProcessingJob,
+    ProcessingRun,
     ProvisionalSelection,
     Round,
     SelectionOrder,
     Team,
     UserSelection,
 )
+from .services.round_events import notify_match_completed
+from .services.scoring import (
+    apply_goal_changes,
+    get_round_goal_counts,
+    refresh_player_goals,
+)
 
 
 @admin.register(League)
@@ -169,49 +180,61 @@ class MatchAdmin(admin.ModelAdmin):
         if request.method == "POST":
             try:
                 data = json.loads(request.body)
+                goals_data = data.get("goals", [])
+
+                # Players whose goal counts may change with this result
+                player_ids = set(match.goals.values_list("player_id", flat=True))
+                player_ids |= {int(goal_data["player_id"]) for goal_data in goals_data}
+
+                with transaction.atomic():
+                    goal_counts_before = get_round_goal_counts(match.round, player_ids)
+
+                    # Clear existing goals
+                    match.goals.all().delete()
+
+                    # Add new goals
+                    home_goals = 0
+                    away_goals = 0
+
+                    for goal_data in goals_data:
+                        player = Player.objects.get(id=goal_data["player_id"])
+                        Goal.objects.create(
+                            match=match,
+                            player=player,
+                            minute=goal_data["minute"],
+                            is_penalty=goal_data.get("is_penalty", False),
+                            is_own_goal=goal_data.get("is_own_goal", False),
+                        )
+
+                        # Count goals for each team
+                        if goal_data.get("is_own_goal"):
+                            # Own goal counts for the other team
+                            if player.team == match.home_team:
+                                away_goals += 1
+                            else:
+                                home_goals += 1
+                        else:
+                            # Regular goal
+                            if player.team == match.home_team:
+                                home_goals += 1
+                            else:
+                                away_goals += 1
 
-                # Clear existing goals
-                match.goals.all().delete()
-
-                # Add new goals
-                home_goals = 0
-                away_goals = 0
-
-                for goal_data in data.get("goals", []):
-                    player = Player.objects.get(id=goal_data["player_id"])
-                    Goal.objects.create(
-                        match=match,
-                        player=player,
-                        minute=goal_data["minute"],
-                        is_penalty=goal_data.get("is_penalty", False),
-                        is_own_goal=goal_data.get("is_own_goal", False),
-                    )
+                    # Update scores and mark as completed
+                    match.home_score = home_goals
+                    match.away_score = away_goals
+                    match.is_completed = True
+                    match.is_manually_edited = True
+                    match.save()
 
-                    # Count goals for each team
-                    if goal_data.get("is_own_goal"):
-                        # Own goal counts for the other team
-                        if player.team == match.home_team:
-                            away_goals += 1
-                        else:
-                            home_goals += 1
-                    else:
-                        # Regular goal
-                        if player.team == match.home_team:
-                            home_goals += 1
-                        else:
-                            away_goals += 1
+                    # Shift standings by the change in goals instead of re-scoring
+                    apply_goal_changes(match.round, player_ids, goal_counts_before)
 
-                # Update scores and mark as completed
-                match.home_score = home_goals
-                match.away_score = away_goals
-                match.is_completed = True
-                match.is_manually_edited = True
-                match.save()
+                    # Update goal counts, including players who lost goals
+                    refresh_player_goals(player_ids)
 
-                # Update player goal counts
-                for player in Player.objects.filter(goals__match=match):
-                    player.goals_scored = player.goals.filter(is_own_goal=False).count()
-                    player.save()
+                # Wake the round processor so standings follow the result
+                notify_match_completed(match)
 
                 return JsonResponse(
                     {"success": True, "message": "Match result updated successfully"}
@@ -255,6 +278,52 @@ class GoalAdmin(admin.ModelAdmin):
     search_fields = ["player__name", "match__home_team__name", "match__away_team__name"]
     ordering = ["match", "minute"]
 
+    def save_model(self, request, obj, form, change):
+        goals = [obj]
+        if change:
+            # The goal may have moved to another player or match
+            goals.append(Goal.objects.select_related("match__round").get(pk=obj.pk))
+        self.update_standings(
+            goals, partial(super().save_model, request, obj, form, change)
+        )
+
+    def delete_model(self, request, obj):
+        self.update_standings([obj], partial(super().delete_model, request, obj))
+
+    def delete_queryset(self, request, queryset):
+        goals = list(queryset.select_related("match__round"))
+        self.update_standings(
+            goals, partial(super().delete_queryset, request, queryset)
+        )
+
+    def update_standings(self, goals, change_goals):
+        """Change goals and shift the standings of their rounds to match.
+
+        Args:
+            goals: The goals being changed, as they are before and after.
+            change_goals: Callable that saves or deletes the goals.
+        """
+        player_ids_by_round = defaultdict(set)
+        matches = {}
+        for goal in goals:
+            player_ids_by_round[goal.match.round].add(goal.player_id)
+            matches[goal.match_id] = goal.match
+
+        with transaction.atomic():
+            goal_counts_before = {
+                round_obj: get_round_goal_counts(round_obj, player_ids)
+                for round_obj, player_ids in player_ids_by_round.items()
+            }
+            change_goals()
+
+            for round_obj, player_ids in player_ids_by_round.items():
+                apply_goal_changes(round_obj, player_ids, goal_counts_before[round_obj])
+            refresh_player_goals(set().union(*player_ids_by_round.values()))
+
+            # Wake the round processor so standings follow the goals
+            for match in matches.values():
+                notify_match_completed(match)
+
 
 @admin.register(UserSelection)
 class UserSelectionAdmin(admin.ModelAdmin):
@@ -286,3 +355,40 @@ class SelectionOrderAdmin(admin.ModelAdmin):
     list_filter = ["league", "round"]
     search_fields = ["user__username", "league__name"]
     ordering = ["league", "round", "order"]
+
+
+@admin.register(ProcessingJob)
+class ProcessingJobAdmin(admin.ModelAdmin):
+    list_display = [
+        "kind",
+        "league",
+        "round",
+        "status",
+        "attempts",
+        "duration",
+        "finished_at",
+    ]
+    list_filter = ["status", "kind", "round"]
+    search_fields = ["league__name", "error"]
+    readonly_fields = ["created_at", "started_at", "finished_at", "duration"]
+
+
+@admin.register(ProcessingRun)
+class ProcessingRunAdmin(admin.ModelAdmin):
+    list_display = [
+        "started_at",
+        "duration",
+        "queries",
+        "db_time",
+        "rows_written",
+    ]
+    date_hierarchy = "started_at"
+    readonly_fields = [
+        "started_at",
+        "finished_at",
+        "duration",
+        "queries",
+        "db_time",
+        "rows_written",
+        "stats",
+    ]
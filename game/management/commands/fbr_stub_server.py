@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from game.services.fbr_fixtures import FixtureServer, load_fixtures
+
+
+class Command(BaseCommand):
+    help = "Serve recorded FBR API and fbref fixtures from a local HTTP server"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fixtures",
+            required=True,
+            help="Directory of fixtures written by record_fbr_fixtures",
+        )
+        parser.add_argument("--host", default="127.0.0.1", help="Address to bind")
+        parser.add_argument("--port", type=int, default=8001, help="Port to bind")
+        parser.add_argument(
+            "--latency-ms",
+            type=int,
+            default=0,
+            help="Delay added to every response, in milliseconds",
+        )
+        parser.add_argument(
+            "--jitter-ms",
+            type=int,
+            default=0,
+            help="Up to this much more random delay, in milliseconds",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0,
+            help="Fraction of requests to answer with --error-status, e.g. 0.1",
+        )
+        parser.add_argument(
+            "--error-status",
+            type=int,
+            default=503,
+            help="Status code of injected errors (429 also sends Retry-After)",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            help="Seed for the random delays and errors, for repeatable runs",
+        )
+
+    def handle(self, *args, **options):
+        if not 0 <= options["error_rate"] <= 1:
+            raise CommandError("--error-rate must be between 0 and 1")
+
+        fixtures = load_fixtures(options["fixtures"])
+        if not fixtures:
+            raise CommandError(f"No fixtures found in {options['fixtures']}")
+
+        server = FixtureServer(
+            (options["host"], options["port"]),
+            fixtures,
+            latency=options["latency_ms"] / 1000,
+            jitter=options["jitter_ms"] / 1000,
+            error_rate=options["error_rate"],
+            error_status=options["error_status"],
+            seed=options["seed"],
+        )
+        url = f"http://{options['host']}:{options['port']}"
+        self.stdout.write(f"Serving {len(fixtures)} fixtures on {url}")
+        self.stdout.write(
+            f"Point the sync at it with FBR_API_BASE_URL={url} FBREF_BASE_URL={url}"
+        )
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,96 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from game.services.fbr_api import FBRAPIError, FBRAPIService
+from game.services.live_ingest import (
+    get_goal_events,
+    get_live_matches,
+    get_next_kickoff,
+    get_unlinked_live_matches,
+    ingest_match_events,
+)
+
+
+class Command(BaseCommand):
+    help = "Follow live matches and record their goals as they are scored"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Poll the live matches once and exit",
+        )
+        parser.add_argument(
+            "--poll-seconds",
+            type=int,
+            default=settings.FBR_LIVE_POLL_SECONDS,
+            help="Time in seconds between polls while matches are live",
+        )
+        parser.add_argument(
+            "--max-sleep",
+            type=int,
+            default=3600,
+            help="Longest time in seconds to sleep while no match is live",
+        )
+
+    def handle(self, *args, **options):
+        fbr_service = FBRAPIService()
+
+        if options["once"]:
+            self.poll_live_matches(fbr_service)
+            return
+
+        self.stdout.write("Starting live match ingestion")
+        while True:
+            live_matches = self.poll_live_matches(fbr_service)
+
+            if live_matches:
+                wait = options["poll_seconds"]
+            else:
+                wait = options["max_sleep"]
+                next_kickoff = get_next_kickoff()
+                if next_kickoff:
+                    wait = min(wait, (next_kickoff - timezone.now()).total_seconds())
+                    self.stdout.write(
+                        f"No live matches - sleeping for {wait:.0f}s until {next_kickoff}"
+                    )
+            time.sleep(max(wait, 1))
+
+    def poll_live_matches(self, fbr_service):
+        """Ingest the events of every live match.
+
+        Returns:
+            int: Number of matches polled.
+        """
+        for match in get_unlinked_live_matches():
+            self.stderr.write(
+                f"{match} is live but has no FBR ID and can't be followed - "
+                "run sync_fbr_data to link it"
+            )
+
+        live_matches = get_live_matches()
+        for match, finished in live_matches:
+            try:
+                team_stats = fbr_service.get_match_player_stats(match.fbr_id)
+            except FBRAPIError as e:
+                self.stdout.write(self.style.ERROR(f"Could not poll {match}: {e}"))
+                continue
+
+            goal_events = get_goal_events(match, team_stats)
+            counts = ingest_match_events(match, goal_events, finished=finished)
+            if counts["added"] or counts["removed"] or counts["completed"]:
+                self.stdout.write(
+                    f"{match}: {counts['added']} goals added, "
+                    f"{counts['removed']} removed"
+                    + (" - full time" if counts["completed"] else "")
+                )
+            if counts["unmatched"]:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"{match}: {counts['unmatched']} goals with unknown scorers"
+                    )
+                )
+        return len(live_matches)
@@ -1,7 +1,12 @@
-import random
-
-from django.core.management.base import BaseCommand
-from django.db import transaction
+import io
+import math
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
 from django.utils import timezone
 
 from game.models import (
@@ -10,27 +15,204 @@ from game.models import (
     LeagueStanding,
     Match,
     Player,
-    ProvisionalSelection,
+    ProcessingJob,
+    ProcessingRun,
     Round,
     SelectionOrder,
     UserSelection,
 )
+from game.services.dry_run import WritePlan
+from game.services.instrumentation import PhaseTimer
+from game.services.jobs import claim_jobs, count_done_jobs, enqueue_jobs, finish_jobs
+from game.services.round_events import wait_for_match_completed
+from game.services.scoring import (
+    calculate_user_points,
+    get_player_goal_counts,
+    get_previous_totals,
+    get_round_goal_counts,
+    get_round_selections,
+    get_unscored_league_ids,
+    refresh_player_goals,
+    save_standings,
+    score_leagues,
+    update_league_positions,
+)
+from game.services.selections import (
+    PLAYERS_PER_ROUND,
+    build_missing_selection_orders,
+    build_selection_orders,
+    copy_missing_provisional_lists,
+    copy_provisional_list,
+    get_leagues_with_selection_orders,
+    get_lists_to_copy,
+    get_selected_players,
+    get_users_with_selections,
+    load_provisional_lists,
+    load_round_totals,
+    load_selection_orders,
+    pick_players,
+    save_selections,
+)
+from game.services.sharding import in_shard, lock_league_round, parse_shard
+
+# Most leagues a worker claims at once
+JOB_BATCH_SIZE = 50
+
+
+def work_job_queue(command, phase, round_obj, league_ids, batch_size):
+    """Claim and run a phase's queued jobs until none are left.
+
+    Jobs are claimed in batches, and each batch runs in its own transaction
+    that holds the claim. If a batch fails it is rolled back and run again
+    one league at a time, so only the failing leagues' jobs are marked
+    failed, to be retried by a later claim.
+
+    Returns:
+        Counter: The merged summary of every job that ran.
+    """
+    summary = Counter()
+    while True:
+        with transaction.atomic():
+            jobs = claim_jobs(phase, round_obj, league_ids, batch_size)
+            if not jobs:
+                return summary
+
+            batches = [jobs]
+            while batches:
+                batch = batches.pop()
+                started_at = timezone.now()
+                leagues = [job.league for job in batch]
+                measure = command.timer.measure(
+                    phase,
+                    round=round_obj.number,
+                    leagues=[league.name for league in leagues],
+                )
+                try:
+                    with measure, transaction.atomic():
+                        batch_summary = command.process_locked_leagues(
+                            phase, round_obj, leagues
+                        )
+                except Exception as e:
+                    if len(batch) > 1:
+                        batches.extend([job] for job in reversed(batch))
+                        continue
+                    finish_jobs(batch, started_at, error=e)
+                    command.stdout.write(
+                        command.style.ERROR(
+                            f"  {phase} failed for {leagues[0].name}: {e}"
+                        )
+                    )
+                    summary["jobs_failed"] += 1
+                else:
+                    finish_jobs(batch, started_at)
+                    summary.update(batch_summary)
+
+
+def work_job_queue_in_worker(phase, round_id, league_ids, batch_size):
+    """Work a phase's job queue in a worker process.
+
+    Returns the captured command output, the phase summary and the timer
+    records so the parent can merge them.
+    """
+    output = io.StringIO()
+    command = Command(stdout=output)
+    command.timer = PhaseTimer()
+    round_obj = Round.objects.get(id=round_id)
+
+    try:
+        summary = work_job_queue(command, phase, round_obj, league_ids, batch_size)
+    finally:
+        connections.close_all()
+
+    return output.getvalue(), summary, command.timer.records
 
 
 class Command(BaseCommand):
     help = "Process round logic: calculate points and confirm selections"
 
+    # Set to a WritePlan in a dry run, so writes are recorded instead of saved
+    plan = None
+
     def add_arguments(self, parser):
         parser.add_argument(
             "--round-id",
             type=int,
             help="Process specific round by ID",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of worker processes to split leagues across",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=JOB_BATCH_SIZE,
+            help="Most leagues processed and committed in one transaction",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="With --round-id, process every league again instead of resuming",
+        )
+        parser.add_argument(
+            "--shard",
+            type=parse_shard,
+            help="Only process leagues in shard i of N, e.g. 0/2",
+        )
+        parser.add_argument(
+            "--positions-only",
+            action="store_true",
+            help="Only recompute positions for every league in --round-id",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Simulate processing without writing, and report timings",
+        )
+        parser.add_argument(
+            "--daemon",
+            action="store_true",
+            help="Keep running, waking at round deadlines and when matches complete",
+        )
+        parser.add_argument(
+            "--max-sleep",
+            type=int,
+            default=3600,
+            help="Longest time in seconds the daemon sleeps between runs",
+        )
 
     def handle(self, *args, **options):
         round_id = options.get("round_id")
-
-        if round_id:
+        self.workers = options.get("workers", 1)
+        self.shard = options.get("shard")
+        self.batch_size = options.get("batch_size", JOB_BATCH_SIZE)
+        self.restart = options.get("restart", False)
+        self.summary = {}
+        self.timer = PhaseTimer()
+        self.started_at = timezone.now()
+        self.plan = WritePlan() if options.get("dry_run") else None
+
+        if self.workers < 1:
+            raise CommandError("--workers must be at least 1")
+        if self.batch_size < 1:
+            raise CommandError("--batch-size must be at least 1")
+        if self.restart and not round_id:
+            raise CommandError("--restart requires --round-id")
+        if self.plan and (self.workers > 1 or options.get("daemon")):
+            raise CommandError("--dry-run can't be combined with --workers or --daemon")
+        if self.plan and options.get("positions_only"):
+            raise CommandError("--dry-run can't be combined with --positions-only")
+
+        if options.get("positions_only"):
+            if not round_id:
+                raise CommandError("--positions-only requires --round-id")
+            changed = update_league_positions(round_id)
+            self.stdout.write(f"Updated {changed} positions for round {round_id}")
+        elif options.get("daemon"):
+            self.run_daemon(options["max_sleep"])
+        elif round_id:
             try:
                 round_obj = Round.objects.get(id=round_id)
                 self.process_round(round_obj)
@@ -39,17 +221,194 @@ class Command(BaseCommand):
                     self.style.ERROR(f"Round with ID {round_id} does not exist")
                 )
         else:
-            # Update round statuses first
+            self.process_due_rounds()
+
+        self.write_summary()
+
+        if self.plan:
+            self.stdout.write("Planned writes (dry run, nothing was saved):")
+            for line in self.plan.report_lines(verbose=options["verbosity"] > 1):
+                self.stdout.write(line)
+
+        self.write_stats()
+
+    def process_due_rounds(self):
+        """Process everything that is due at the current time"""
+        # Update round statuses first
+        with self.timer.measure("update_round_statuses"):
             self.update_round_statuses()
 
-            # Update points for any newly completed matches
-            self.update_points_for_completed_matches()
+        # Update points for any newly completed matches
+        self.update_points_for_completed_matches()
+
+        # Process rounds that need selection processing
+        self.process_selection_rounds()
+
+        # Process rounds that need completion processing
+        self.process_completion_rounds()
+
+    def run_daemon(self, max_sleep):
+        """Process rounds as they become due, sleeping in between.
+
+        The daemon wakes at the next round boundary (selection opening or
+        closing, or the round ending), or earlier when a match result is
+        entered. It doesn't query the database while it waits.
+        """
+        self.stdout.write("Starting round processor daemon")
+
+        while True:
+            self.process_due_rounds()
+            self.write_summary()
+            self.write_stats()
+            self.summary = {}
+            self.timer = PhaseTimer()
+            self.started_at = timezone.now()
+
+            now = timezone.now()
+            next_boundary = Round.get_next_boundary()
+            if next_boundary:
+                # Wake just after the boundary so it counts as passed
+                wait = (next_boundary - now + timedelta(seconds=1)).total_seconds()
+                wait = min(wait, max_sleep)
+                self.stdout.write(
+                    f"Sleeping for {wait:.0f}s until {next_boundary} (or a match completes)"
+                )
+            else:
+                wait = max_sleep
+                self.stdout.write(
+                    f"No upcoming round boundaries - sleeping for {wait:.0f}s"
+                )
+
+            match_ids = wait_for_match_completed(wait)
+            if match_ids:
+                self.stdout.write(f"Woken by completed matches: {', '.join(match_ids)}")
+
+    def write_summary(self):
+        """Write the merged per-phase counts for this run"""
+        for phase, summary in self.summary.items():
+            counts = ", ".join(
+                f"{key}={value}" for key, value in sorted(summary.items())
+            )
+            self.stdout.write(f"Summary for {phase}: {counts or 'nothing left to do'}")
+
+    def write_stats(self):
+        """Print the phase stats as JSON lines and save them as a run.
+
+        Dry runs only print them.
+        """
+        for line in self.timer.json_lines():
+            self.stdout.write(line)
+
+        if self.plan or not self.timer.records:
+            return
+
+        finished_at = timezone.now()
+        totals = self.timer.totals()
+        ProcessingRun.objects.create(
+            started_at=self.started_at,
+            finished_at=finished_at,
+            duration=finished_at - self.started_at,
+            queries=totals["queries"],
+            db_time=timedelta(seconds=totals["db_seconds"]),
+            rows_written=totals["rows_written"],
+            stats=self.timer.records,
+        )
+
+    def run_league_phase(self, phase, round_obj):
+        """Run a league-level phase for every league.
+
+        Each league gets a job for the phase, and the jobs are worked in
+        batches by this process or, with several workers, by a process pool
+        where each worker uses its own database connection. Every batch
+        commits on its own, and the finished jobs act as checkpoints: a rerun
+        after a crash only processes the leagues that weren't done.
+
+        A dry run skips the queue and runs every league in one go.
+        """
+        if self.plan:
+            measure = self.timer.measure(phase, round=round_obj.number)
+            with measure, transaction.atomic():
+                summary = self.process_locked_leagues(
+                    phase, round_obj, self.get_leagues()
+                )
+            self.summary.setdefault(phase, Counter()).update(summary)
+            return summary
+
+        league_ids = [league.id for league in self.get_leagues()]
+        # Catch-up scoring runs again each time more matches complete
+        enqueue_jobs(
+            phase,
+            round_obj,
+            league_ids,
+            requeue=self.restart or phase == ProcessingJob.SCORE_LEAGUE,
+        )
 
-            # Process rounds that need selection processing
-            self.process_selection_rounds()
+        done_count = count_done_jobs(phase, round_obj, league_ids)
+        if 0 < done_count < len(league_ids):
+            self.stdout.write(
+                f"  Resuming {phase} for {round_obj.name}: "
+                f"{len(league_ids) - done_count} of {len(league_ids)} leagues left"
+            )
 
-            # Process rounds that need completion processing
-            self.process_completion_rounds()
+        workers = self.workers
+        batch_size = min(self.batch_size, math.ceil(len(league_ids) / workers) or 1)
+
+        if workers <= 1:
+            with self.timer.measure(phase, round=round_obj.number):
+                summary = work_job_queue(self, phase, round_obj, league_ids, batch_size)
+            self.summary.setdefault(phase, Counter()).update(summary)
+            return summary
+
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+
+        summary = Counter()
+        with self.timer.measure(phase, round=round_obj.number) as stats:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("fork"),
+            ) as pool:
+                futures = [
+                    pool.submit(
+                        work_job_queue_in_worker,
+                        phase,
+                        round_obj.id,
+                        league_ids,
+                        batch_size,
+                    )
+                    for _ in range(workers)
+                ]
+                for future in as_completed(futures):
+                    output, worker_summary, records = future.result()
+                    self.stdout.write(output, ending="")
+                    summary.update(worker_summary)
+                    # Worker queries ran on their own connections
+                    self.timer.merge(records, into=stats)
+
+        self.summary.setdefault(phase, Counter()).update(summary)
+        return summary
+
+    def get_leagues(self):
+        """Get the leagues this processor is responsible for"""
+        return [
+            league for league in League.objects.all() if in_shard(league.id, self.shard)
+        ]
+
+    def process_locked_leagues(self, phase, round_obj, leagues):
+        """Run a league-level phase while holding each league's round lock.
+
+        Must be called inside a transaction, which holds the locks until it
+        ends. A league another processor is working on is waited for, and
+        since every phase skips work that's already done, overlapping
+        processors never write the same rows twice. Locks are always taken
+        in league ID order so processors can't deadlock, but the leagues are
+        processed in the order given.
+        """
+        if not self.plan:
+            for league in sorted(leagues, key=lambda league: league.id):
+                lock_league_round(league.id, round_obj.id)
+
+        return getattr(self, phase)(round_obj, leagues)
 
     def update_round_statuses(self):
         """Update round statuses based on current time"""
@@ -75,7 +434,7 @@ class Command(BaseCommand):
 
         for round_obj in rounds_to_open:
             round_obj.is_active = True
-            round_obj.save()
+            self.save_round(round_obj)
             self.stdout.write(f"Opened selection for {round_obj.name}")
 
     def process_selection_rounds(self):
@@ -110,6 +469,13 @@ class Command(BaseCommand):
                     f"Round {round_obj.name} has {incomplete_matches} incomplete matches - skipping completion"
                 )
 
+    def save_round(self, round_obj):
+        """Save round status changes, or plan them in a dry run"""
+        if self.plan:
+            self.plan.update(round_obj, ["is_active", "is_completed"])
+        else:
+            round_obj.save()
+
     def process_round(self, round_obj):
         """Process both selections and completion for a specific round"""
         self.process_round_selections(round_obj)
@@ -119,258 +485,296 @@ class Command(BaseCommand):
         """Confirm user selections based on their provisional lists"""
         self.stdout.write(f"Processing selections for {round_obj.name}...")
 
-        leagues = League.objects.all()
+        self.run_league_phase("select_league_players", round_obj)
 
-        for league in leagues:
-            self.stdout.write(f"  Processing league: {league.name}")
+    def select_league_players(self, round_obj, leagues):
+        """Run the selection draft for the given leagues"""
+        # Orders are normally precomputed when the previous round completes
+        self.ensure_selection_orders(round_obj, leagues)
+
+        # Users without a list for this round reuse last round's, copied in
+        # one statement before the draft starts
+        previous_round = Round.objects.filter(number=round_obj.number - 1).first()
+        if self.plan:
+            copied_provisionals = copy_provisional_list(
+                get_lists_to_copy(round_obj, previous_round, leagues)
+                .select_related("player")
+                .order_by("priority"),
+                round_obj,
+            )
+            self.plan.insert(copied_provisionals)
+            copied_count = len(copied_provisionals)
+        else:
+            copied_provisionals = []
+            copied_count = copy_missing_provisional_lists(
+                round_obj, previous_round, leagues
+            )
+
+        # Load orders, provisional lists and existing picks for every league
+        selection_orders = load_selection_orders(round_obj, leagues)
+        if self.plan:
+            selection_orders.update(self.plan.get_selection_orders(round_obj, leagues))
+        provisional_lists = load_provisional_lists([round_obj], leagues)
+        for provisional in copied_provisionals:
+            key = (provisional.league_id, provisional.user_id, round_obj.id)
+            provisional_lists.setdefault(key, []).append(provisional)
+        users_with_selections = get_users_with_selections(round_obj, leagues)
+        taken_players = get_selected_players(round_obj, leagues)
 
-            # Get or create selection order for this round
-            self.ensure_selection_order(league, round_obj)
+        new_selections = []
 
-            # Get selection order for this league/round
-            selection_orders = SelectionOrder.objects.filter(
-                league=league, round=round_obj
-            ).order_by("order")
+        for league in leagues:
+            self.stdout.write(f"  Processing league: {league.name}")
 
-            # Track selected players in this league
-            selected_players = set()
+            # Track selected players in this league, including picks from
+            # an earlier run
+            selected_players = set(taken_players.get(league.id, ()))
 
-            for selection_order in selection_orders:
+            for selection_order in selection_orders.get(league.id, []):
                 user = selection_order.user
 
                 # Skip if user already has selections for this round
-                if UserSelection.objects.filter(
-                    user=user, league=league, round=round_obj
-                ).exists():
+                if (league.id, user.id) in users_with_selections:
                     continue
 
                 # Get user's provisional selections for this round
-                provisional_selections = ProvisionalSelection.objects.filter(
-                    user=user, league=league, round=round_obj
-                ).order_by("priority")
-
-                # If no provisional selections, try to copy from previous round
-                if not provisional_selections.exists():
-                    self.copy_previous_round_selections(user, league, round_obj)
-                    provisional_selections = ProvisionalSelection.objects.filter(
-                        user=user, league=league, round=round_obj
-                    ).order_by("priority")
+                provisional_list = provisional_lists.get(
+                    (league.id, user.id, round_obj.id), []
+                )
 
                 # Select top 3 available players
-                selected_count = 0
-                for provisional in provisional_selections:
-                    if (
-                        provisional.player.id not in selected_players
-                        and selected_count < 3
-                    ):
-                        UserSelection.objects.create(
+                players = pick_players(provisional_list, selected_players)
+                for i, player in enumerate(players):
+                    new_selections.append(
+                        UserSelection(
                             user=user,
                             league=league,
                             round=round_obj,
-                            player=provisional.player,
-                            selection_order=selected_count + 1,
-                        )
-                        selected_players.add(provisional.player.id)
-                        selected_count += 1
-
-                        self.stdout.write(
-                            f"    {user.username} selected {provisional.player.name}"
+                            player=player,
+                            selection_order=i + 1,
                         )
+                    )
+                    self.stdout.write(f"    {user.username} selected {player.name}")
 
-                if selected_count < 3:
+                if len(players) < PLAYERS_PER_ROUND:
                     self.stdout.write(
-                        f"    Warning: {user.username} only selected {selected_count} players"
+                        f"    Warning: {user.username} only selected {len(players)} players"
                     )
 
+        # Persist every league's picks at once
+        if self.plan:
+            self.plan.add_selections(round_obj, new_selections)
+        else:
+            save_selections(new_selections)
+
+        return Counter(
+            leagues=len(leagues),
+            selections_created=len(new_selections),
+            provisional_selections_copied=copied_count,
+        )
+
     def process_round_completion(self, round_obj):
         """Calculate points and update standings when round completes"""
         self.stdout.write(f"Processing completion for {round_obj.name}...")
 
         # Update player goal counts from manually entered goals
-        self.update_player_goals_from_matches(round_obj)
+        with self.timer.measure(
+            "update_player_goals_from_matches", round=round_obj.number
+        ):
+            self.update_player_goals_from_matches(round_obj)
+
+        self.run_league_phase("complete_league_round", round_obj)
+
+        # Leagues may belong to other shards or have failed, and the round is
+        # only picked up for completion while it's open, so leave it open
+        # until every league's completion job is done
+        league_count = League.objects.count()
+        done_count = count_done_jobs(ProcessingJob.COMPLETE_ROUND, round_obj)
+        if not self.plan and done_count < league_count:
+            self.stdout.write(
+                f"Round {round_obj.name} has {league_count - done_count} leagues "
+                "still to complete - not marking it completed yet"
+            )
+            return
 
-        leagues = League.objects.all()
+        # Mark round as completed and inactive
+        round_obj.is_completed = True
+        round_obj.is_active = False
+        self.save_round(round_obj)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Round {round_obj.name} processing completed")
+        )
 
+    def complete_league_round(self, round_obj, leagues):
+        """Calculate final points and positions for the given leagues"""
+        # Load everything needed to score the round up front
+        goal_counts = get_round_goal_counts(round_obj)
+        selections_by_league = get_round_selections(round_obj, leagues)
+        previous_totals = get_previous_totals(round_obj, leagues)
+        if self.plan:
+            self.plan.merge_selections(round_obj, selections_by_league)
+            for key, points in self.plan.get_total_adjustments(round_obj).items():
+                previous_totals[key] = previous_totals.get(key, 0) + points
+
+        standings = []
         for league in leagues:
             self.stdout.write(f"  Calculating points for league: {league.name}")
 
-            # Get all user selections for this round/league
-            user_selections = UserSelection.objects.filter(
-                league=league, round=round_obj
-            ).select_related("user", "player")
+            user_selections = selections_by_league.get(league.id, [])
 
-            # Group by user
-            user_points = {}
             for selection in user_selections:
-                if selection.user not in user_points:
-                    user_points[selection.user] = 0
-
-                # Count goals scored by this player in this round (excluding own goals)
-                goals_in_round = Goal.objects.filter(
-                    player=selection.player,
-                    match__round=round_obj,
-                    is_own_goal=False,  # Don't count own goals for the player
-                ).count()
-
-                user_points[selection.user] += goals_in_round
-
+                goals_in_round = goal_counts.get(selection.player_id, 0)
                 if goals_in_round > 0:
                     self.stdout.write(
                         f"    {selection.user.username}: {selection.player.name} scored {goals_in_round} goals"
                     )
 
-            # Update or create league standings
-            for user, points in user_points.items():
-                # Get previous total points
-                previous_standing = (
-                    LeagueStanding.objects.filter(
-                        league=league, user=user, round__number__lt=round_obj.number
-                    )
-                    .order_by("-round__number")
-                    .first()
-                )
+            user_points = calculate_user_points(user_selections, goal_counts)
 
-                previous_total = (
-                    previous_standing.total_points if previous_standing else 0
-                )
+            for user, points in user_points.items():
+                previous_total = previous_totals.get((league.id, user.id), 0)
                 new_total = previous_total + points
 
-                LeagueStanding.objects.update_or_create(
-                    league=league,
-                    user=user,
-                    round=round_obj,
-                    defaults={"points": points, "total_points": new_total},
+                standings.append(
+                    LeagueStanding(
+                        league=league,
+                        user=user,
+                        round=round_obj,
+                        points=points,
+                        total_points=new_total,
+                    )
                 )
 
                 self.stdout.write(
                     f"    {user.username}: {points} points this round, {new_total} total"
                 )
 
-            # Update positions
-            self.update_league_positions(league, round_obj)
+        # Write all standings for the round at once
+        self.save_standings(round_obj, leagues, standings)
 
-        # Mark round as completed and inactive
-        round_obj.is_completed = True
-        round_obj.is_active = False
-        round_obj.save()
+        # Precompute the next round's selection order from the final totals,
+        # so nothing needs ordering when its selection closes
+        orders_created = 0
+        next_round = Round.objects.filter(number=round_obj.number + 1).first()
+        if next_round:
+            orders_created = self.ensure_selection_orders(next_round, leagues)
 
-        self.stdout.write(
-            self.style.SUCCESS(f"Round {round_obj.name} processing completed")
+        return Counter(
+            leagues=len(leagues),
+            standings_written=len(standings),
+            selection_orders_precomputed=orders_created,
         )
 
     def update_player_goals_from_matches(self, round_obj):
         """Update player goal counts from manually entered match results"""
         self.stdout.write(f"  Updating player goal counts from matches...")
 
-        # Get all players who scored in this round
-        players_with_goals = Player.objects.filter(
-            goals__match__round=round_obj
-        ).distinct()
+        # Refresh everyone who scored in this round
+        player_ids = (
+            Goal.objects.filter(match__round=round_obj)
+            .order_by()
+            .values_list("player_id", flat=True)
+            .distinct()
+        )
 
-        for player in players_with_goals:
-            # Count total goals (excluding own goals) for this player
-            total_goals = Goal.objects.filter(player=player, is_own_goal=False).count()
+        if self.plan:
+            goal_counts = get_player_goal_counts(player_ids)
+            changed = []
+            for player in Player.objects.filter(id__in=player_ids).order_by("name"):
+                player = self.plan.get_planned(player)
+                total_goals = goal_counts.get(player.id, 0)
+                if player.goals_scored != total_goals:
+                    player.goals_scored = total_goals
+                    self.plan.update(player, ["goals_scored"])
+                    changed.append((player.id, player.name, total_goals))
+        else:
+            changed = refresh_player_goals(player_ids)
 
-            if player.goals_scored != total_goals:
-                player.goals_scored = total_goals
-                player.save()
-                self.stdout.write(
-                    f"    Updated {player.name}: {total_goals} total goals"
-                )
+        for _, name, total_goals in changed:
+            self.stdout.write(f"    Updated {name}: {total_goals} total goals")
 
-    def ensure_selection_order(self, league, round_obj):
-        """Ensure selection order exists for this league/round"""
-        if SelectionOrder.objects.filter(league=league, round=round_obj).exists():
-            return
+    def ensure_selection_orders(self, round_obj, leagues):
+        """Create the selection order for every league that lacks one.
+
+        Leagues that already have an order get anyone who joined since it was
+        built added to the end.
 
-        participants = league.participants.all()
+        Returns:
+            int: Number of leagues that got a new order.
+        """
+        existing = get_leagues_with_selection_orders(round_obj, leagues)
+        if self.plan:
+            existing.update(self.plan.get_selection_orders(round_obj, leagues))
+        self.add_missing_participants(
+            round_obj, [league for league in leagues if league.id in existing]
+        )
+        leagues = [league for league in leagues if league.id not in existing]
+        if not leagues:
+            return 0
 
-        if round_obj.number == 1:
-            # Random order for first round
-            participant_list = list(participants)
-            random.shuffle(participant_list)
-            participant_users = [p.user for p in participant_list]
+        # Order by lowest total points first (from previous round), or at
+        # random for the first round
+        previous_totals = None
+        previous_round = Round.objects.filter(number=round_obj.number - 1).first()
+        if round_obj.number != 1 and previous_round:
+            previous_totals = load_round_totals(previous_round, leagues)
+            if self.plan:
+                previous_totals.update(self.plan.get_round_totals(previous_round))
+
+        orders_by_league = build_selection_orders(round_obj, leagues, previous_totals)
+        if self.plan:
+            for league in leagues:
+                self.plan.add_selection_orders(
+                    league, round_obj, orders_by_league[league.id]
+                )
         else:
-            # Order by lowest total points first (from previous round)
-            previous_round = Round.objects.filter(number=round_obj.number - 1).first()
-            if previous_round:
-                # Get standings from the previous round
-                standings = LeagueStanding.objects.filter(
-                    league=league, round=previous_round
-                ).order_by(
-                    "total_points"
-                )  # Lowest points first
-
-                # If there are ties, we need to randomize within each tie group
-                standings_list = list(standings)
-
-                # Group by total points for tie-breaking
-                points_groups = {}
-                for standing in standings_list:
-                    points = standing.total_points
-                    if points not in points_groups:
-                        points_groups[points] = []
-                    points_groups[points].append(standing.user)
-
-                # Build final order with random tie-breaking
-                participant_users = []
-                for points in sorted(points_groups.keys()):  # Lowest to highest
-                    tied_users = points_groups[points]
-                    random.shuffle(tied_users)  # Random tie-breaker
-                    participant_users.extend(tied_users)
-
-                # Add any participants who weren't in previous round
-                existing_users = set(participant_users)
-                for participant in participants:
-                    if participant.user not in existing_users:
-                        participant_users.append(participant.user)
-            else:
-                # Fallback to random if no previous round found
-                participant_list = [p.user for p in participants]
-                random.shuffle(participant_list)
-                participant_users = participant_list
-
-        # Create selection orders
-        for i, user in enumerate(participant_users):
-            SelectionOrder.objects.create(
-                league=league, round=round_obj, user=user, order=i + 1
+            SelectionOrder.objects.bulk_create(
+                order for orders in orders_by_league.values() for order in orders
             )
 
-        self.stdout.write(
-            f"    Created selection order for {len(participant_users)} users in {league.name}"
-        )
+        for league in leagues:
+            self.stdout.write(
+                f"    Created selection order for {len(orders_by_league[league.id])} users in {league.name}"
+            )
+        return len(leagues)
 
-    def copy_previous_round_selections(self, user, league, round_obj):
-        """Copy provisional selections from previous round if none exist"""
-        previous_round = Round.objects.filter(number=round_obj.number - 1).first()
-        if not previous_round:
+    def add_missing_participants(self, round_obj, leagues):
+        """Add participants who joined after the orders were built"""
+        if not leagues:
             return
 
-        previous_selections = ProvisionalSelection.objects.filter(
-            user=user, league=league, round=previous_round
-        ).order_by("priority")
-
-        for selection in previous_selections:
-            ProvisionalSelection.objects.create(
-                user=user,
-                league=league,
-                round=round_obj,
-                player=selection.player,
-                priority=selection.priority,
+        orders_by_league = load_selection_orders(round_obj, leagues)
+        if self.plan:
+            orders_by_league.update(self.plan.get_selection_orders(round_obj, leagues))
+        missing_by_league = build_missing_selection_orders(
+            round_obj, leagues, orders_by_league
+        )
+        if self.plan:
+            for league in leagues:
+                if league.id in missing_by_league:
+                    self.plan.extend_selection_orders(
+                        league,
+                        round_obj,
+                        orders_by_league[league.id],
+                        missing_by_league[league.id],
+                    )
+        else:
+            SelectionOrder.objects.bulk_create(
+                order for orders in missing_by_league.values() for order in orders
             )
 
-    def update_league_positions(self, league, round_obj):
-        """Update positions in league standings"""
-        standings = LeagueStanding.objects.filter(
-            league=league, round=round_obj
-        ).order_by("-total_points", "user__username")
-
-        for i, standing in enumerate(standings):
-            standing.position = i + 1
-            standing.save()
+        for league in leagues:
+            for selection_order in missing_by_league.get(league.id, []):
+                self.stdout.write(
+                    f"    Added {selection_order.user.username} to the selection order in {league.name}"
+                )
 
     def update_points_for_completed_matches(self):
-        """Update points for matches that have been completed since last run"""
+        """Make sure rounds with completed matches have standings.
+
+        Later goal changes are applied incrementally as results are entered.
+        """
         self.stdout.write("Checking for newly completed matches...")
 
         # Find rounds that are active but not completed
@@ -386,60 +790,42 @@ class Command(BaseCommand):
                 )
 
                 # Update player goal counts
-                self.update_player_goals_from_matches(round_obj)
-
-                # Recalculate points for all leagues
-                leagues = League.objects.all()
-
-                for league in leagues:
-                    # Get all user selections for this round/league
-                    user_selections = UserSelection.objects.filter(
-                        league=league, round=round_obj
-                    ).select_related("user", "player")
-
-                    if not user_selections.exists():
-                        continue  # Skip if no selections made yet
-
-                    # Recalculate points for this round
-                    user_points = {}
-                    for selection in user_selections:
-                        if selection.user not in user_points:
-                            user_points[selection.user] = 0
-
-                        # Count goals scored by this player in this round (excluding own goals)
-                        goals_in_round = Goal.objects.filter(
-                            player=selection.player,
-                            match__round=round_obj,
-                            is_own_goal=False,
-                        ).count()
-
-                        user_points[selection.user] += goals_in_round
-
-                    # Update league standings for this round
-                    for user, points in user_points.items():
-                        # Get previous total points from earlier rounds
-                        previous_total = 0
-                        if round_obj.number > 1:
-                            previous_standing = (
-                                LeagueStanding.objects.filter(
-                                    league=league,
-                                    user=user,
-                                    round__number__lt=round_obj.number,
-                                )
-                                .order_by("-round__number")
-                                .first()
-                            )
-                            if previous_standing:
-                                previous_total = previous_standing.total_points
-
-                        new_total = previous_total + points
-
-                        LeagueStanding.objects.update_or_create(
-                            league=league,
-                            user=user,
-                            round=round_obj,
-                            defaults={"points": points, "total_points": new_total},
-                        )
+                with self.timer.measure(
+                    "update_player_goals_from_matches", round=round_obj.number
+                ):
+                    self.update_player_goals_from_matches(round_obj)
+
+                # Score leagues that don't have standings yet
+                self.run_league_phase("update_league_points", round_obj)
+
+    def update_league_points(self, round_obj, leagues):
+        """Score leagues where users have selections but no standings yet.
+
+        Leagues that already have standings for the round are kept up to date
+        incrementally when results are entered, so they are left alone here.
+        """
+        unscored_league_ids = get_unscored_league_ids(round_obj, leagues)
+        unscored_leagues = [
+            league for league in leagues if league.id in unscored_league_ids
+        ]
+
+        standings = score_leagues(round_obj, unscored_leagues)
+        self.save_standings(round_obj, unscored_leagues, standings)
+
+        return Counter(leagues=len(unscored_leagues), standings_written=len(standings))
+
+    def save_standings(self, round_obj, leagues, standings):
+        """Save a round's standings and positions, or plan them in a dry run"""
+        if self.plan:
+            existing_points = {
+                (league_id, user_id): points
+                for league_id, user_id, points in LeagueStanding.objects.filter(
+                    round=round_obj, league__in=leagues
+                ).values_list("league_id", "user_id", "points")
+            }
+            self.plan.add_standings(standings, existing_points)
+            return
 
-                    # Update positions
-                    self.update_league_positions(league, round_obj)
+        save_standings(standings)
+        if leagues:
+            update_league_positions(round_obj, leagues)
@@ -0,0 +1,187 @@
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from game.models import League, LeagueStanding, Round, UserSelection
+from game.services.scoring import (
+    get_previous_totals,
+    get_round_goal_counts,
+    rebuild_league_totals,
+    save_standings,
+    update_league_positions,
+)
+from game.services.selections import discard_pending_selection_orders
+from game.services.sharding import lock_league_rounds
+
+
+class Command(BaseCommand):
+    help = "Recalculate league standings for every round from goals and selections"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--from-round",
+            type=int,
+            default=1,
+            help="Round number to start rebuilding from (earlier totals are kept)",
+        )
+        parser.add_argument(
+            "--league",
+            help=(
+                "Only fix this league's total points from its stored round "
+                "points, reading its whole history in one query"
+            ),
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Show the differences without writing anything",
+        )
+
+    def handle(self, *args, **options):
+        from_round = options["from_round"]
+        dry_run = options["dry_run"]
+
+        if options["league"]:
+            self.rebuild_totals(options["league"], dry_run)
+            return
+
+        rounds = list(Round.objects.filter(number__gte=from_round).order_by("number"))
+        if not rounds:
+            raise CommandError(f"No rounds from round {from_round} onwards")
+
+        self.league_names = dict(League.objects.values_list("id", "name"))
+        self.usernames = dict(
+            User.objects.filter(selections__isnull=False)
+            .values_list("id", "username")
+            .distinct()
+        )
+
+        changed_count = 0
+        with transaction.atomic():
+            # Wait for processors and goal changes touching these rounds, and
+            # keep them out until the rebuild is saved
+            lock_league_rounds(
+                list(self.league_names), [round_obj.id for round_obj in rounds]
+            )
+
+            # Running totals per (league ID, user ID), starting from earlier
+            # rounds
+            running_totals = defaultdict(
+                int, get_previous_totals(rounds[0], League.objects.all())
+            )
+
+            for round_obj in rounds:
+                changed_count += self.rebuild_round(round_obj, running_totals, dry_run)
+
+            # Precomputed orders for upcoming rounds were based on the old totals
+            if changed_count and not dry_run:
+                discard_pending_selection_orders(rounds[0], League.objects.all())
+
+        if dry_run:
+            self.stdout.write(f"Dry run: {changed_count} standings would change")
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f"Rebuilt standings: {changed_count} changed")
+            )
+
+    def rebuild_round(self, round_obj, running_totals, dry_run):
+        """Recalculate one round's standings and add them to the running totals.
+
+        Returns:
+            int: Number of standings that were created or changed.
+        """
+        goal_counts = get_round_goal_counts(round_obj)
+
+        round_points = defaultdict(int)
+        for league_id, user_id, player_id in UserSelection.objects.filter(
+            round=round_obj
+        ).values_list("league_id", "user_id", "player_id"):
+            round_points[(league_id, user_id)] += goal_counts.get(player_id, 0)
+
+        if not round_points:
+            return 0
+
+        existing_standings = LeagueStanding.objects.filter(round=round_obj).values_list(
+            "league_id", "user_id", "points", "total_points"
+        )
+        existing = {
+            (league_id, user_id): (points, total_points)
+            for league_id, user_id, points, total_points in existing_standings
+        }
+
+        standings = []
+        for (league_id, user_id), points in round_points.items():
+            running_totals[(league_id, user_id)] += points
+            total_points = running_totals[(league_id, user_id)]
+
+            old = existing.get((league_id, user_id))
+            if old == (points, total_points):
+                continue
+
+            standings.append(
+                LeagueStanding(
+                    league_id=league_id,
+                    user_id=user_id,
+                    round=round_obj,
+                    points=points,
+                    total_points=total_points,
+                )
+            )
+
+            if dry_run:
+                name = f"{self.league_names[league_id]} - {self.usernames[user_id]}"
+                if old:
+                    self.stdout.write(
+                        f"  Round {round_obj.number} {name}: points {old[0]} -> {points}, "
+                        f"total {old[1]} -> {total_points}"
+                    )
+                else:
+                    self.stdout.write(
+                        f"  Round {round_obj.number} {name}: new standing with "
+                        f"{points} points, {total_points} total"
+                    )
+
+        self.stdout.write(
+            f"Round {round_obj.number}: {len(round_points)} standings, "
+            f"{len(standings)} changed"
+        )
+
+        if not dry_run and standings:
+            save_standings(standings)
+            update_league_positions(round_obj)
+
+        return len(standings)
+
+    def rebuild_totals(self, league_id, dry_run):
+        """Recalculate one league's running totals from its round points"""
+        try:
+            league = League.objects.get(id=league_id)
+        except (League.DoesNotExist, ValidationError):
+            raise CommandError(f"League with ID {league_id} does not exist")
+
+        with transaction.atomic():
+            changed = rebuild_league_totals([league], dry_run=dry_run)
+
+        if dry_run:
+            round_numbers = dict(Round.objects.values_list("id", "number"))
+            usernames = dict(
+                User.objects.filter(
+                    id__in={standing.user_id for standing in changed}
+                ).values_list("id", "username")
+            )
+            for standing in changed:
+                self.stdout.write(
+                    f"  Round {round_numbers[standing.round_id]} {league.name} - "
+                    f"{usernames[standing.user_id]}: total "
+                    f"{standing.old_total_points} -> {standing.total_points}"
+                )
+            self.stdout.write(f"Dry run: {len(changed)} totals would change")
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Rebuilt totals for {league.name}: {len(changed)} changed"
+                )
+            )
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from game.services.fbr_api import FBRAPIError, FBRAPIService
+
+
+class Command(BaseCommand):
+    help = "Record FBR API and fbref responses as fixtures for fbr_stub_server"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--out",
+            required=True,
+            help="Directory to write the fixture files to",
+        )
+        parser.add_argument(
+            "--competition",
+            type=int,
+            default=162,
+            help="Competition ID to record",
+        )
+
+    def handle(self, *args, **options):
+        competition_id = options["competition"]
+        # Bypass the response cache so every response comes from the network
+        fbr_service = FBRAPIService(use_cache=False, record_dir=options["out"])
+
+        try:
+            teams = fbr_service.get_teams(competition_id)
+            matches = fbr_service.get_matches(competition_id)
+            squads = fbr_service.get_players_for_teams(
+                [team["team_id"] for team in teams]
+            )
+        except FBRAPIError as e:
+            raise CommandError(f"Recording failed: {e}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Recorded {len(teams)} teams, {len(matches)} matches and "
+                f"{len(squads)} squads to {options['out']}"
+            )
+        )
@@ -1,7 +1,7 @@
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
-from game.services.fbr_api import FBRAPIService
+from game.services.fbr_api import FBRAPIError, FBRAPIService
 
 
 class Command(BaseCommand):
@@ -14,6 +14,11 @@ class Command(BaseCommand):
             default=162,
             help="Competition ID to sync",
         )
+        parser.add_argument(
+            "--no-cache",
+            action="store_true",
+            help="Fetch everything again instead of using cached responses",
+        )
 
     def handle(self, *args, **options):
         competition_id = options["competition"]
@@ -21,9 +26,29 @@ class Command(BaseCommand):
         self.stdout.write(f"Database connection: {settings.DATABASES['default']}")
         self.stdout.write(f"Starting sync for competition: {competition_id}")
 
-        fbr_service = FBRAPIService()
-        fbr_service.sync_all_data(competition_id)
-
+        fbr_service = FBRAPIService(use_cache=not options["no_cache"])
+        try:
+            results = fbr_service.sync_all_data(competition_id)
+        except FBRAPIError as e:
+            raise CommandError(f"Sync failed: {e}")
+        finally:
+            self.write_request_stats(fbr_service)
+
+        for name, counts in results.items():
+            self.stdout.write(
+                f"{name}: {counts['inserted']} inserted, {counts['updated']} updated, "
+                f"{counts['unchanged']} unchanged, {counts['skipped']} skipped"
+            )
         self.stdout.write(
             self.style.SUCCESS(f"Successfully synced data for {competition_id}")
         )
+
+    def write_request_stats(self, fbr_service):
+        """Print the number of requests, retries and mean latency per endpoint"""
+        for endpoint, stats in fbr_service.get_stats().items():
+            self.stdout.write(
+                f"{endpoint}: {stats['requests']} requests, "
+                f"{stats['retries']} retries, {stats['failures']} failures, "
+                f"{stats['cache_hits']} cache hits, {stats['revalidated']} revalidated, "
+                f"{stats['mean_seconds']}s mean"
+            )
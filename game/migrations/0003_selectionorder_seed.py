@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("game", "0002_match_is_manually_edited"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="selectionorder",
+            name="seed",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.23 on 2026-10-18 09:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("game", "0004_processingjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProcessingRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("started_at", models.DateTimeField()),
+                ("finished_at", models.DateTimeField()),
+                ("duration", models.DurationField()),
+                ("queries", models.IntegerField(default=0)),
+                ("db_time", models.DurationField()),
+                ("rows_written", models.IntegerField(default=0)),
+                ("stats", models.JSONField(default=list)),
+            ],
+            options={
+                "ordering": ["-started_at"],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 09:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("game", "0006_content_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="goal",
+            name="fbr_event_id",
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.23 on 2026-10-18 09:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("game", "0007_goal_fbr_event_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FBRAPIKey",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=100)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "FBR API key",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
@@ -56,6 +56,8 @@ class Round(models.Model):
     ends_at = models.DateTimeField()
     is_active = models.BooleanField(default=False)
     is_completed = models.BooleanField(default=False)
+    # Hash of the upstream data this row was last synced from
+    content_hash = models.CharField(max_length=64, blank=True, default="")
 
     class Meta:
         ordering = ["number"]
@@ -111,6 +113,22 @@ class Round(models.Model):
             .first()
         )
 
+    @classmethod
+    def get_next_boundary(cls):
+        """Get the next time a round opens or closes selection, or ends"""
+        from django.utils import timezone
+
+        now = timezone.now()
+        boundaries = [
+            boundary
+            for round_times in cls.objects.filter(is_completed=False).values_list(
+                "selection_opens", "selection_closes", "ends_at"
+            )
+            for boundary in round_times
+            if boundary > now
+        ]
+        return min(boundaries, default=None)
+
 
 class Team(models.Model):
     """Football teams"""
@@ -118,6 +136,8 @@ class Team(models.Model):
     name = models.CharField(max_length=100)
     country = models.CharField(max_length=100)
     fbr_id = models.CharField(max_length=50, unique=True, null=True, blank=True)
+    # Hash of the upstream data this row was last synced from
+    content_hash = models.CharField(max_length=64, blank=True, default="")
 
     def __str__(self):
         return self.name
@@ -131,6 +151,8 @@ class Player(models.Model):
     position = models.CharField(max_length=50)
     fbr_id = models.CharField(max_length=50, unique=True, null=True, blank=True)
     goals_scored = models.IntegerField(default=0)
+    # Hash of the upstream data this row was last synced from
+    content_hash = models.CharField(max_length=64, blank=True, default="")
 
     def __str__(self):
         return f"{self.name} ({self.team.name})"
@@ -158,6 +180,8 @@ class Match(models.Model):
         help_text="Marks if this match has been manually edited and should be ignored by sync_fbr_data",
     )
     fbr_id = models.CharField(max_length=50, unique=True, null=True, blank=True)
+    # Hash of the upstream data this row was last synced from
+    content_hash = models.CharField(max_length=64, blank=True, default="")
 
     def __str__(self):
         return f"{self.home_team.name} vs {self.away_team.name}"
@@ -174,6 +198,8 @@ class Goal(models.Model):
     minute = models.IntegerField()
     is_penalty = models.BooleanField(default=False)
     is_own_goal = models.BooleanField(default=False)
+    # Upstream event the goal was ingested from, empty for goals entered by hand
+    fbr_event_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
 
     def __str__(self):
         return f"{self.player.name} - {self.minute}'"
@@ -268,6 +294,8 @@ class SelectionOrder(models.Model):
         User, on_delete=models.CASCADE, related_name="selection_orders"
     )
     order = models.IntegerField()  # 1 = picks first, etc.
+    # Seed for the random tie-break, so the order can be rebuilt
+    seed = models.BigIntegerField(null=True, blank=True)
 
     class Meta:
         unique_together = ("league", "round", "user")
@@ -275,3 +303,81 @@ class SelectionOrder(models.Model):
 
     def __str__(self):
         return f"{self.league.name} - Round {self.round.number}: {self.user.username} picks {self.order}"
+
+
+class ProcessingJob(models.Model):
+    """A unit of round processing work for one league"""
+
+    # Kinds are named after the process_round phase that runs them
+    SELECT_PLAYERS = "select_league_players"
+    SCORE_LEAGUE = "update_league_points"
+    COMPLETE_ROUND = "complete_league_round"
+    KIND_CHOICES = [
+        (SELECT_PLAYERS, "Confirm selections"),
+        (SCORE_LEAGUE, "Score league"),
+        (COMPLETE_ROUND, "Complete round"),
+    ]
+
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    kind = models.CharField(max_length=50, choices=KIND_CHOICES)
+    league = models.ForeignKey(
+        League, on_delete=models.CASCADE, related_name="processing_jobs"
+    )
+    round = models.ForeignKey(
+        Round, on_delete=models.CASCADE, related_name="processing_jobs"
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration = models.DurationField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ("kind", "league", "round")
+        ordering = ["created_at", "id"]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for {self.league.name} - Round {self.round.number} ({self.status})"
+
+
+class ProcessingRun(models.Model):
+    """Timings and database statistics of one process_round run"""
+
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField()
+    duration = models.DurationField()
+    queries = models.IntegerField(default=0)
+    db_time = models.DurationField()
+    rows_written = models.IntegerField(default=0)
+    # One entry per phase and per batch of leagues, as printed by the command
+    stats = models.JSONField(default=list)
+
+    class Meta:
+        ordering = ["-started_at"]
+
+    def __str__(self):
+        return f"Processing run at {self.started_at} ({self.duration})"
+
+
+class FBRAPIKey(models.Model):
+    """API key for FBR API, kept so it can be reused across runs"""
+
+    key = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "FBR API key"
+
+    def __str__(self):
+        return f"FBR API key created at {self.created_at}"
@@ -0,0 +1,140 @@
+from collections import defaultdict
+
+
+class WritePlan:
+    """Writes that a dry run of process_round would have made.
+
+    Nothing is saved. Later phases read planned rows back, so the simulation
+    sees the same state a real run would have written: planned selection
+    orders feed the draft, planned selections feed scoring, and planned
+    standings feed the totals of later rounds.
+    """
+
+    def __init__(self):
+        self.inserts = defaultdict(list)
+        self.updates = defaultdict(dict)
+        self.selection_orders = {}
+        self.selections = defaultdict(list)
+        self.standings = {}
+
+    def insert(self, objects):
+        """Record unsaved objects that would have been inserted"""
+        for obj in objects:
+            self.inserts[type(obj).__name__].append(obj)
+
+    def update(self, obj, fields, key=None):
+        """Record an object whose fields would have been updated.
+
+        Rows are identified by primary key unless another key is given.
+        Updating the same row again replaces the earlier planned update.
+        """
+        self.updates[type(obj).__name__][key or obj.pk] = (obj, fields)
+
+    def get_planned(self, obj):
+        """Get the planned version of a saved object, or the object itself"""
+        planned = self.updates[type(obj).__name__].get(obj.pk)
+        return planned[0] if planned else obj
+
+    def add_selection_orders(self, league, round_obj, selection_orders):
+        self.selection_orders[(league.id, round_obj.id)] = selection_orders
+        self.insert(selection_orders)
+
+    def extend_selection_orders(self, league, round_obj, selection_orders, missing):
+        """Record orders added to the end of a league's existing order"""
+        self.selection_orders[(league.id, round_obj.id)] = selection_orders + missing
+        self.insert(missing)
+
+    def get_selection_orders(self, round_obj, leagues):
+        """Get planned selection orders in the shape of load_selection_orders"""
+        return {
+            league.id: self.selection_orders[(league.id, round_obj.id)]
+            for league in leagues
+            if (league.id, round_obj.id) in self.selection_orders
+        }
+
+    def add_selections(self, round_obj, selections):
+        self.selections[round_obj.id].extend(selections)
+        self.insert(selections)
+
+    def merge_selections(self, round_obj, selections_by_league):
+        """Add planned selections to the result of get_round_selections"""
+        planned_by_league = defaultdict(list)
+        for selection in self.selections.get(round_obj.id, []):
+            planned_by_league[selection.league.id].append(selection)
+
+        for league_id, planned in planned_by_league.items():
+            merged = selections_by_league.get(league_id, []) + planned
+            merged.sort(key=lambda s: (s.user.id, s.selection_order))
+            selections_by_league[league_id] = merged
+        return selections_by_league
+
+    def add_standings(self, standings, existing_points):
+        """Record planned standings and rank them within their league.
+
+        Args:
+            standings: Unsaved LeagueStanding objects for one round.
+            existing_points: Mapping of (league ID, user ID) to the points of
+                the standing already saved for the round, if any.
+        """
+        by_league = defaultdict(list)
+        for standing in standings:
+            key = (standing.league.id, standing.user.id)
+            old_points = existing_points.get(key)
+            self.standings[key + (standing.round.id,)] = (standing, old_points)
+            by_league[standing.league.id].append(standing)
+
+            if old_points is None:
+                self.insert([standing])
+            else:
+                self.update(
+                    standing,
+                    ["points", "total_points", "position"],
+                    key=key + (standing.round.id,),
+                )
+
+        for league_standings in by_league.values():
+            league_standings.sort(key=lambda s: (-s.total_points, s.user.username))
+            for i, standing in enumerate(league_standings):
+                standing.position = i + 1
+
+    def get_round_totals(self, round_obj):
+        """Get planned total points in the shape of load_round_totals"""
+        return {
+            (standing.league.id, standing.user.id): standing.total_points
+            for standing, _ in self.standings.values()
+            if standing.round.id == round_obj.id
+        }
+
+    def get_total_adjustments(self, round_obj):
+        """Get the change planned standings make to totals before a round.
+
+        Returns:
+            dict: Mapping of (league ID, user ID) to the points to add to the
+            totals read from the database.
+        """
+        adjustments = defaultdict(int)
+        for standing, old_points in self.standings.values():
+            if standing.round.number < round_obj.number:
+                key = (standing.league.id, standing.user.id)
+                adjustments[key] += standing.points - (old_points or 0)
+        return adjustments
+
+    def report_lines(self, verbose=False):
+        """Describe the planned inserts and updates, one model per line"""
+        models = sorted(set(self.inserts) | set(self.updates))
+        if not models:
+            return ["  No changes"]
+
+        lines = []
+        for model in models:
+            lines.append(
+                f"  {model}: {len(self.inserts[model])} inserts, "
+                f"{len(self.updates[model])} updates"
+            )
+            if verbose:
+                lines.extend(f"    + {obj}" for obj in self.inserts[model])
+                lines.extend(
+                    f"    ~ {obj} ({', '.join(fields)})"
+                    for obj, fields in self.updates[model].values()
+                )
+        return lines
@@ -1,24 +1,70 @@
 import logging
+import threading
 import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
 
-import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 
 from django.conf import settings
-
-from game.models import Goal, Match, Player, Round, Team
+from django.db import transaction
+from django.utils import timezone
+
+from game.models import FBRAPIKey
+from game.services.fbr_fixtures import FixtureRecorder
+from game.services.fbr_sync import (
+    sync_match_ids,
+    sync_matches,
+    sync_players,
+    sync_rounds,
+    sync_teams,
+)
+from game.services.html_tables import iter_table_rows
+from game.services.http_cache import ResponseCache
+from game.services.rate_limit import HostRateLimiter
+from game.services.scoring import refresh_player_goals
 
 logger = logging.getLogger(__name__)
 
+# Responses worth retrying, as the server may answer differently next time
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+# Responses to a request with a stale or revoked API key
+AUTH_FAILURE_STATUSES = {401, 403}
+
+
+class FBRAPIError(Exception):
+    """Raised when a request still fails after every retry"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
 
 class FBRAPIService:
     """Service for interacting with FBR API"""
 
-    def __init__(self):
+    def __init__(self, use_cache=True, record_dir=None):
+        # Loaded or generated on the first request that needs it
         self.api_key = None
-        self.base_url = settings.FBR_API_BASE_URL
-        self.generate_api_key()
-        self.headers = {"X-API-Key": self.api_key}
+        self.api_key_lock = threading.Lock()
+        self.base_url = settings.FBR_API_BASE_URL.rstrip("/")
+        self.fbref_url = settings.FBREF_BASE_URL.rstrip("/")
+        self.session = self.create_session()
+        self.cache = None
+        if use_cache and settings.FBR_API_CACHE_DIR:
+            self.cache = ResponseCache(
+                settings.FBR_API_CACHE_DIR, settings.FBR_API_CACHE_MAX_BYTES
+            )
+        self.rate_limiter = HostRateLimiter(settings.FBR_API_RATE_LIMITS)
+        # Saves every response as a fixture for the stub server to replay
+        self.recorder = FixtureRecorder(record_dir) if record_dir else None
+        # Requests, retries, failures and seconds spent per endpoint
+        self.stats = defaultdict(Counter)
+        self.stats_lock = threading.Lock()
 
         # while not self.check_required_tables():
         #     logger.error("Required tables are missing. Retrying in 10 seconds...")
@@ -43,178 +89,371 @@ class FBRAPIService:
     #         return False
     #     return True
 
-    def generate_api_key(self):
-        """Generate a new API key for the FBR API"""
+    def create_session(self):
+        """Create a session that keeps connections open between requests.
+
+        Retries are handled by send_with_retries(), so the adapter doesn't
+        retry.
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=settings.FBR_API_POOL_SIZE,
+            pool_maxsize=settings.FBR_API_POOL_SIZE,
+            max_retries=0,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def request(self, method, url, endpoint, authenticated=False, **kwargs):
+        """Make a request, answering it from the response cache if possible.
+
+        GET requests to endpoints with a TTL in FBR_API_CACHE_TTLS are
+        cached. Within the TTL the cached response is returned without a
+        request. After it, the request asks the server whether the response
+        changed (If-None-Match / If-Modified-Since), and reuses the cached
+        body if it didn't.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL to request.
+            endpoint (str): Name the request is counted under in stats.
+            authenticated (bool): Send the API key with the request.
+
+        Raises:
+            FBRAPIError: If the request fails, see send_with_retries().
+        """
+        ttl = settings.FBR_API_CACHE_TTLS.get(endpoint)
+        if self.cache is None or method != "GET" or ttl is None:
+            return self.send(method, url, endpoint, authenticated, **kwargs)
+
+        key = self.cache.get_key(url, kwargs.get("params"))
+        cached, age = self.cache.get(key)
+        if cached is not None and age < ttl:
+            with self.stats_lock:
+                self.stats[endpoint]["cache_hits"] += 1
+            return cached
+
+        if cached is not None:
+            headers = dict(kwargs.get("headers") or {})
+            if "ETag" in cached.headers:
+                headers["If-None-Match"] = cached.headers["ETag"]
+            if "Last-Modified" in cached.headers:
+                headers["If-Modified-Since"] = cached.headers["Last-Modified"]
+            kwargs["headers"] = headers
+
+        response = self.send(method, url, endpoint, authenticated, **kwargs)
+        if response.status_code == 304 and cached is not None:
+            self.cache.touch(key)
+            with self.stats_lock:
+                self.stats[endpoint]["revalidated"] += 1
+            return cached
+
+        self.cache.set(key, response)
+        return response
+
+    def send(self, method, url, endpoint, authenticated=False, **kwargs):
+        """Send a request, with the API key if it's authenticated.
+
+        If the API key is rejected, a new one is generated and the request is
+        sent once more with it.
+        """
+        if not authenticated:
+            return self.send_with_retries(method, url, endpoint, **kwargs)
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        api_key = self.get_api_key()
+        try:
+            return self.send_with_retries(
+                method,
+                url,
+                endpoint,
+                headers={**headers, "X-API-Key": api_key},
+                **kwargs,
+            )
+        except FBRAPIError as e:
+            if e.status_code not in AUTH_FAILURE_STATUSES:
+                raise
+            logger.warning(f"FBR API key was rejected ({e}), generating a new one")
+
+        api_key = self.renew_api_key(api_key)
+        return self.send_with_retries(
+            method, url, endpoint, headers={**headers, "X-API-Key": api_key}, **kwargs
+        )
+
+    def send_with_retries(self, method, url, endpoint, **kwargs):
+        """Send a request, retrying connection errors and busy servers.
+
+        Every attempt waits for the rate limit of the URL's host. Retries back
+        off exponentially, or wait as long as the server asks with a
+        Retry-After header. Safe to call from several threads.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL to request.
+            endpoint (str): Name the request is counted under in stats.
+
+        Raises:
+            FBRAPIError: If the request still fails after every retry, or
+                fails in a way that retrying won't fix.
+        """
+        kwargs.setdefault("timeout", settings.FBR_API_TIMEOUT)
+        # Counted locally and added under the lock, as threads share the stats
+        stats = Counter()
+
         try:
-            url = f"{self.base_url}/generate_api_key"
-            response = requests.post(url)
-            self.api_key = response.json().get("api_key")
-        except requests.RequestException as e:
-            logger.error(f"Error generating API key: {e}")
+            for attempt in range(settings.FBR_API_MAX_RETRIES + 1):
+                stats["requests"] += 1
+                stats["throttled_seconds"] += self.rate_limiter.acquire(url)
+                start = time.perf_counter()
+                response = None
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                    error = None
+                    if response.status_code in RETRY_STATUSES:
+                        error = requests.HTTPError(
+                            f"{response.status_code} for {url}", response=response
+                        )
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    error = e
+                except requests.RequestException as e:
+                    stats["failures"] += 1
+                    raise FBRAPIError(f"{endpoint} request failed: {e}") from e
+                finally:
+                    stats["seconds"] += time.perf_counter() - start
+
+                if error is None:
+                    try:
+                        response.raise_for_status()
+                    except requests.HTTPError as e:
+                        stats["failures"] += 1
+                        raise FBRAPIError(
+                            f"{endpoint} request failed: {e}",
+                            status_code=response.status_code,
+                        ) from e
+                    if self.recorder is not None:
+                        self.recorder.save(method, endpoint, response)
+                    return response
+
+                if attempt == settings.FBR_API_MAX_RETRIES:
+                    stats["failures"] += 1
+                    raise FBRAPIError(
+                        f"{endpoint} request failed after {attempt + 1} attempts: {error}"
+                    ) from error
+
+                delay = self.get_retry_delay(attempt, response)
+                logger.warning(
+                    f"{endpoint} request failed ({error}), retrying in {delay:.1f}s"
+                )
+                stats["retries"] += 1
+                time.sleep(delay)
+        finally:
+            with self.stats_lock:
+                self.stats[endpoint].update(stats)
+
+    def get_retry_delay(self, attempt, response=None):
+        """Seconds to wait before retrying, preferring the server's Retry-After"""
+        delay = settings.FBR_API_BACKOFF * 2**attempt
+        retry_after = None
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    retry_at = parsedate_to_datetime(retry_after)
+                    delay = (retry_at - timezone.now()).total_seconds()
+                except (TypeError, ValueError):
+                    pass
+        return min(max(delay, 0), settings.FBR_API_MAX_BACKOFF)
+
+    def get_stats(self):
+        """Request statistics per endpoint, with the mean latency of each"""
+        return {
+            endpoint: {
+                "requests": stats["requests"],
+                "retries": stats["retries"],
+                "failures": stats["failures"],
+                "cache_hits": stats["cache_hits"],
+                "revalidated": stats["revalidated"],
+                "mean_seconds": round(stats["seconds"] / (stats["requests"] or 1), 3),
+                "throttled_seconds": round(stats["throttled_seconds"], 1),
+            }
+            for endpoint, stats in self.stats.items()
+        }
+
+    def get_api_key(self):
+        """The API key, reusing the last one generated if there is one"""
+        with self.api_key_lock:
+            if self.api_key is None:
+                saved_key = FBRAPIKey.objects.first()
+                if saved_key:
+                    self.api_key = saved_key.key
+                else:
+                    self.generate_api_key()
+            return self.api_key
+
+    def renew_api_key(self, rejected_key):
+        """Replace an API key the server rejected.
+
+        Threads or processes that see the same key rejected at once share
+        the first replacement instead of generating one each.
+        """
+        with self.api_key_lock:
+            saved_key = FBRAPIKey.objects.first()
+            if saved_key and saved_key.key != rejected_key:
+                self.api_key = saved_key.key
+            elif self.api_key == rejected_key:
+                self.generate_api_key()
+            return self.api_key
+
+    def generate_api_key(self):
+        """Generate a new API key for the FBR API and save it for later runs"""
+        url = f"{self.base_url}/generate_api_key"
+        response = self.request("POST", url, "generate_api_key")
+        api_key = response.json().get("api_key")
+        if not api_key:
+            raise FBRAPIError("generate_api_key response has no api_key")
+
+        saved_key = FBRAPIKey.objects.create(key=api_key)
+        FBRAPIKey.objects.exclude(id=saved_key.id).delete()
+        self.api_key = api_key
 
     def get_teams(self, league_id=162):
         """Fetch teams for a given competition"""
-        try:
-            url = f"{self.base_url}/league-standings"
-            params = {"league_id": league_id, "season_id": "2025"}
-            response = requests.get(url, headers=self.headers, params=params)
-            response.raise_for_status()
-
-            teams = []
-
-            for table in response.json()["data"]:
-                for standing in table["standings"]:
-                    teams.append(
-                        {
-                            "team_name": standing["team_name"],
-                            "team_id": standing["team_id"],
-                        }
-                    )
-                    logger.info(
-                        f"Fetched team: {standing['team_name']} (ID: {standing['team_id']})"
-                    )
-            return teams
-
-        except requests.RequestException as e:
-            logger.error(f"Error fetching teams: {e}")
-            return []
+        url = f"{self.base_url}/league-standings"
+        params = {"league_id": league_id, "season_id": "2025"}
+        response = self.request(
+            "GET", url, "league-standings", authenticated=True, params=params
+        )
+
+        teams = []
+
+        for table in response.json()["data"]:
+            for standing in table["standings"]:
+                teams.append(
+                    {
+                        "team_name": standing["team_name"],
+                        "team_id": standing["team_id"],
+                    }
+                )
+                logger.info(
+                    f"Fetched team: {standing['team_name']} (ID: {standing['team_id']})"
+                )
+        return teams
 
     def get_players_on_team(self, team_id):
         """Fetch players for a specific team. The API is faulty so we scrape
-        directly from the FBRef website.
+        directly from the FBRef website, within its rate limit.
 
         Args:
             team_id (str): The team ID to fetch players for.
         """
-        try:
-            url = f"https://fbref.com/en/squads/{team_id}/"
-            df = pd.read_html(url)
-            time.sleep(6)  # Sleep to avoid hitting the server too fast
-
-            players_df = df[0]
-            players = []
+        url = f"{self.fbref_url}/en/squads/{team_id}/"
+        response = self.request("GET", url, "fbref squads")
+        response.encoding = response.encoding or "utf-8"
+
+        # The squad's players are in the page's first table
+        chunks = response.iter_content(chunk_size=64 * 1024, decode_unicode=True)
+        players = [
+            {
+                "name": row["player"],
+                "goals_scored": 0,  # We will calculate tournament goals later
+            }
+            for row in iter_table_rows(chunks)
+            if row.get("player")
+        ]
+
+        if not players:
+            logger.error(f"Error reading players for team {team_id}: no player rows")
+        logger.info(f"Fetched {len(players)} players for team ID {team_id}")
+        return players
+
+    def get_players_for_teams(self, team_ids):
+        """Fetch the players of several teams at once.
+
+        Squad pages are fetched concurrently, so the refresh runs as fast as
+        the rate limits in FBR_API_RATE_LIMITS allow.
 
-            for _, row in players_df.iterrows():
-                player = {
-                    "name": row["Unnamed: 0_level_0"]["Player"],
-                    "goals_scored": 0,  # We will calculate tournament goals later
-                }
-                players.append(player)
-
-            logger.info(f"Fetched {len(players)} players for team ID {team_id}")
-            return players
+        Args:
+            team_ids (list): The team IDs to fetch players for.
 
-        except Exception as e:
-            logger.error(f"Error fetching players for team {team_id}: {e}")
-            return []
+        Returns:
+            dict: Players for each team ID.
+        """
+        with ThreadPoolExecutor(max_workers=settings.FBR_API_MAX_WORKERS) as executor:
+            return dict(zip(team_ids, executor.map(self.get_players_on_team, team_ids)))
 
     def get_matches(self, league_id=162):
         """Fetch matches for a given league"""
-        try:
-            url = f"{self.base_url}/matches"
-            params = {"league_id": league_id, "season_id": "2025"}
-            response = requests.get(url, headers=self.headers, params=params)
-            response.raise_for_status()
+        url = f"{self.base_url}/matches"
+        params = {"league_id": league_id, "season_id": "2025"}
+        response = self.request(
+            "GET", url, "matches", authenticated=True, params=params
+        )
+
+        matches = response.json()["data"]
+        logger.info(f"Fetched {len(matches)} matches for league ID {league_id}")
+        return matches
 
-            matches = response.json()["data"]
-            logger.info(f"Fetched {len(matches)} matches for league ID {league_id}")
-            return matches
+    def get_match_player_stats(self, match_id):
+        """Fetch the stats of every player in a match, for following it live.
 
-        except requests.RequestException as e:
-            logger.error(f"Error fetching matches: {e}")
-            return []
+        Each team's entry has its "team_id" and a "players" list, where each
+        player has "meta_data" (with "player_id" and "player_name") and
+        "stats", whose "summary" holds the goals ("gls") and penalties scored
+        ("pk_made"). Responses are never cached, as the stats change while
+        the match is played.
+
+        Args:
+            match_id (str): The match's FBR ID.
+        """
+        url = f"{self.base_url}/all-players-match-stats"
+        response = self.request(
+            "GET",
+            url,
+            "all-players-match-stats",
+            authenticated=True,
+            params={"match_id": match_id},
+        )
+        return response.json()["data"]
 
     def sync_all_data(self, league_id=162):
-        """Sync all data from FBR API"""
+        """Sync all data from FBR API.
+
+        Everything is fetched first and then written in one transaction, so a
+        failed sync leaves the database as it was. Rows whose upstream data
+        hasn't changed since the last sync aren't written.
+
+        Returns:
+            dict: Number of rows inserted, updated, unchanged and skipped for
+                teams, players, rounds, matches and the matches' FBR IDs.
+        """
         logger.info("Starting full data sync from FBR API")
 
-        # Sync teams
         teams = self.get_teams(league_id)
-        for team in teams:
-            Team.objects.update_or_create(
-                name=team["team_name"],
-                country=team["team_name"],
-                fbr_id=team["team_id"],
-            )
-            logger.info(f"Synced team: {team['team_name']}")
-
-        for player in settings.WEURO_2025_PLAYERS:
-            goals_scored = Goal.objects.filter(
-                player=Player.objects.get(name=player["name"]),
-                is_own_goal=False,
-            ).count()
-
-            Player.objects.update_or_create(
-                name=player["name"],
-                team_id=Team.objects.get(name=player["team"]).id,
-                defaults={"goals_scored": goals_scored},
-            )
-            logger.info(f"Synced player: {player['name']} for team {player['team']}")
-
-        # Update rounds
-        for round_data in settings.WEURO_2025_ROUNDS:
-            round_obj, created = Round.objects.update_or_create(
-                number=round_data["number"],
-                defaults={
-                    "name": round_data["name"],
-                    "selection_opens": round_data["selection_opens"],
-                    "selection_closes": round_data["selection_closes"],
-                    "starts_at": round_data["starts_at"],
-                    "ends_at": round_data["ends_at"],
-                    "is_active": round_data.get("is_active", False),
-                    "is_completed": round_data.get("is_completed", False),
-                },
-            )
-            if created:
-                logger.info(f"Created new round: {round_obj.name}")
-            else:
-                logger.info(f"Updated existing round: {round_obj.name}")
-
-        # Sync matches
-        matches = settings.WEURO_2025_MATCHES
-        for match in matches:
-            home_team = Team.objects.get(fbr_id=match["home_team_id"])
-            away_team = Team.objects.get(fbr_id=match["away_team_id"])
-
-            # Time in data is in CEST, so we need to convert to UTC
-            kickoff_time = f"{match['date']} {match['time']}"
-            kickoff_time = (
-                pd.to_datetime(kickoff_time)
-                .tz_localize(tz="Europe/Berlin")
-                .tz_convert(tz="UTC")
-            )
-
-            # Round ID is determined from the timestamp
-            round_obj = Round.objects.filter(
-                starts_at__lte=kickoff_time, ends_at__gte=kickoff_time
-            ).first()
-
-            # Skip sync for completed matches and manually edited matches
-            if Match.objects.filter(
-                home_team=home_team,
-                away_team=away_team,
-                kickoff_time=kickoff_time,
-                round_id=round_obj.id,
-                is_completed=True,
-                is_manually_edited=True,
-            ).exists():
+        # Only used for the matches' FBR IDs, which live ingestion needs
+        upstream_matches = self.get_matches(league_id)
+
+        results = {}
+        with transaction.atomic():
+            for name, sync, data in [
+                ("teams", sync_teams, teams),
+                ("players", sync_players, settings.WEURO_2025_PLAYERS),
+                ("rounds", sync_rounds, settings.WEURO_2025_ROUNDS),
+                ("matches", sync_matches, settings.WEURO_2025_MATCHES),
+                ("match ids", sync_match_ids, upstream_matches),
+            ]:
+                results[name] = counts = sync(data)
                 logger.info(
-                    f"Skipping match sync for completed or manually edited match: {home_team.name} vs {away_team.name} at {kickoff_time}"
+                    f"Synced {name}: {counts['inserted']} inserted, "
+                    f"{counts['updated']} updated, {counts['unchanged']} unchanged, "
+                    f"{counts['skipped']} skipped"
                 )
-                continue
-
-            Match.objects.update_or_create(
-                home_team=home_team,
-                away_team=away_team,
-                kickoff_time=kickoff_time,
-                round_id=round_obj.id,
-                defaults={
-                    "is_completed": False,  # Matches are not completed initially
-                    "is_manually_edited": False,  # Matches are not manually edited initially
-                },
-            )
-            logger.info(
-                f"Synced match: {home_team.name} vs {away_team.name} at {kickoff_time}"
-            )
+
+            # Recount goals for every player in one statement
+            refresh_player_goals()
 
         logger.info("Full data sync completed")
+        return results
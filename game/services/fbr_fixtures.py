@@ -0,0 +1,176 @@
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Endpoints whose responses aren't worth replaying or shouldn't be kept
+UNRECORDED_ENDPOINTS = {"generate_api_key"}
+
+# Key the stub server hands out in place of a real one
+STUB_API_KEY = "stub-api-key"
+
+
+def get_fixture_key(method, path, query):
+    """Name of the fixture for a request, ignoring headers such as the API key"""
+    target = f"{method} {path}?{urlencode(sorted(query.items()))}"
+    return hashlib.sha256(target.encode()).hexdigest()[:16]
+
+
+class FixtureRecorder:
+    """Saves responses as fixture files that FixtureServer can replay.
+
+    Each fixture is a JSON file with the request's method, path and query,
+    and the response's status, content type and body.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def save(self, method, endpoint, response):
+        """Save a response, replacing an earlier recording of the same request"""
+        if endpoint in UNRECORDED_ENDPOINTS:
+            return
+
+        # Record the URL that was asked for rather than where it redirected
+        request_url = (response.history[0] if response.history else response).url
+        url = urlsplit(request_url)
+        query = dict(parse_qsl(url.query))
+        key = get_fixture_key(method, url.path, query)
+        fixture = {
+            "endpoint": endpoint,
+            "method": method,
+            "path": url.path,
+            "query": query,
+            "status": response.status_code,
+            "content_type": response.headers.get("Content-Type", ""),
+            "body": response.text,
+        }
+        slug = endpoint.replace(" ", "-")
+        path = self.directory / f"{slug}-{key}.json"
+        path.write_text(json.dumps(fixture, indent=2, ensure_ascii=False))
+
+
+def load_fixtures(directory):
+    """Load recorded fixtures, keyed by get_fixture_key"""
+    fixtures = {}
+    for path in sorted(Path(directory).glob("*.json")):
+        fixture = json.loads(path.read_text())
+        key = get_fixture_key(fixture["method"], fixture["path"], fixture["query"])
+        fixtures[key] = fixture
+    return fixtures
+
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    """Replays the fixture matching each request"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.replay("GET")
+
+    def do_POST(self):
+        self.replay("POST")
+
+    def replay(self, method):
+        server = self.server
+        url = urlsplit(self.path)
+        time.sleep(server.get_latency())
+
+        if url.path.rstrip("/").endswith("/generate_api_key"):
+            self.send_body(
+                200, "application/json", json.dumps({"api_key": STUB_API_KEY})
+            )
+            return
+
+        if server.should_fail():
+            headers = {"Retry-After": "1"} if server.error_status == 429 else {}
+            self.send_body(
+                server.error_status,
+                "application/json",
+                json.dumps({"detail": "Injected error"}),
+                headers,
+            )
+            return
+
+        key = get_fixture_key(method, url.path, dict(parse_qsl(url.query)))
+        fixture = server.fixtures.get(key)
+        if fixture is None:
+            self.send_body(
+                404,
+                "application/json",
+                json.dumps({"detail": f"No fixture for {method} {self.path}"}),
+            )
+            return
+
+        etag = f'"{key}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_body(304, fixture["content_type"], "", {"ETag": etag})
+            return
+
+        self.send_body(
+            fixture["status"], fixture["content_type"], fixture["body"], {"ETag": etag}
+        )
+
+    def send_body(self, status, content_type, body, headers=None):
+        content = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """Local HTTP server standing in for FBR API and fbref.com.
+
+    Args:
+        address: (host, port) to listen on.
+        fixtures (dict): Fixtures from load_fixtures().
+        latency (float): Seconds added to every response.
+        jitter (float): Up to this many more seconds, chosen at random.
+        error_rate (float): Fraction of requests answered with error_status.
+        error_status (int): Status code of injected errors.
+        seed: Seed for the random latency and errors, for repeatable runs.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        fixtures,
+        latency=0,
+        jitter=0,
+        error_rate=0,
+        error_status=503,
+        seed=None,
+    ):
+        super().__init__(address, FixtureRequestHandler)
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+
+    def get_latency(self):
+        with self.random_lock:
+            return self.latency + self.random.uniform(0, self.jitter)
+
+    def should_fail(self):
+        with self.random_lock:
+            return self.random.random() < self.error_rate
@@ -0,0 +1,294 @@
+import hashlib
+import json
+import logging
+from collections import Counter
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from django.utils.dateparse import parse_datetime
+
+from game.models import Match, Player, Round, Team
+
+logger = logging.getLogger(__name__)
+
+# Kickoff times in the match data are local to the tournament
+MATCH_TIME_ZONE = ZoneInfo("Europe/Berlin")
+
+ROUND_FIELDS = [
+    "name",
+    "selection_opens",
+    "selection_closes",
+    "starts_at",
+    "ends_at",
+    "is_active",
+    "is_completed",
+]
+
+
+def get_content_hash(data):
+    """Hash of an upstream record, which changes only when the record does"""
+    content = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def sync_teams(teams):
+    """Create or update teams from the standings, keyed by FBR ID.
+
+    Args:
+        teams (list): Dicts with "team_name" and "team_id".
+
+    Returns:
+        Counter: Number of teams inserted, updated and unchanged.
+    """
+    existing = dict(Team.objects.values_list("fbr_id", "content_hash"))
+    counts = Counter()
+
+    changed = []
+    for team in teams:
+        content_hash = get_content_hash(team)
+        if team["team_id"] not in existing:
+            counts["inserted"] += 1
+        elif existing[team["team_id"]] == content_hash:
+            counts["unchanged"] += 1
+            continue
+        else:
+            counts["updated"] += 1
+        changed.append(
+            Team(
+                name=team["team_name"],
+                country=team["team_name"],
+                fbr_id=team["team_id"],
+                content_hash=content_hash,
+            )
+        )
+
+    Team.objects.bulk_create(
+        changed,
+        update_conflicts=True,
+        unique_fields=["fbr_id"],
+        update_fields=["name", "country", "content_hash"],
+    )
+    return counts
+
+
+def sync_players(players):
+    """Create players, keyed by name and team name.
+
+    Args:
+        players (list): Dicts with "name" and "team".
+
+    Returns:
+        Counter: Number of players inserted, updated and unchanged.
+    """
+    teams = {team.name: team for team in Team.objects.all()}
+    existing = {
+        (player.name, player.team_id): player
+        for player in Player.objects.only("name", "team_id", "content_hash")
+    }
+
+    new_players = []
+    changed_players = []
+    for player_data in players:
+        team = teams[player_data["team"]]
+        content_hash = get_content_hash(player_data)
+        player = existing.get((player_data["name"], team.id))
+        if player is None:
+            player = Player(
+                name=player_data["name"], team=team, content_hash=content_hash
+            )
+            existing[(player.name, team.id)] = player
+            new_players.append(player)
+        elif player.content_hash != content_hash:
+            player.content_hash = content_hash
+            changed_players.append(player)
+
+    Player.objects.bulk_create(new_players)
+    Player.objects.bulk_update(changed_players, ["content_hash"])
+    return Counter(
+        inserted=len(new_players),
+        updated=len(changed_players),
+        unchanged=len(players) - len(new_players) - len(changed_players),
+    )
+
+
+def sync_rounds(rounds):
+    """Create or update rounds, keyed by number.
+
+    Args:
+        rounds (list): Dicts with the round's number and its ROUND_FIELDS.
+
+    Returns:
+        Counter: Number of rounds inserted, updated and unchanged.
+    """
+    existing = {round_obj.number: round_obj for round_obj in Round.objects.all()}
+    counts = Counter()
+
+    new_rounds = []
+    changed_rounds = []
+    for round_data in rounds:
+        content_hash = get_content_hash(round_data)
+        round_obj = existing.get(round_data["number"])
+        if round_obj is not None and round_obj.content_hash == content_hash:
+            counts["unchanged"] += 1
+            continue
+
+        values = {
+            "name": round_data["name"],
+            "selection_opens": parse_datetime(round_data["selection_opens"]),
+            "selection_closes": parse_datetime(round_data["selection_closes"]),
+            "starts_at": parse_datetime(round_data["starts_at"]),
+            "ends_at": parse_datetime(round_data["ends_at"]),
+            "is_active": round_data.get("is_active", False),
+            "is_completed": round_data.get("is_completed", False),
+            "content_hash": content_hash,
+        }
+        if round_obj is None:
+            new_rounds.append(Round(number=round_data["number"], **values))
+        else:
+            for field, value in values.items():
+                setattr(round_obj, field, value)
+            changed_rounds.append(round_obj)
+
+    Round.objects.bulk_create(new_rounds)
+    Round.objects.bulk_update(changed_rounds, ROUND_FIELDS + ["content_hash"])
+    counts["inserted"] += len(new_rounds)
+    counts["updated"] += len(changed_rounds)
+    return counts
+
+
+def get_kickoff_time(match):
+    """Kickoff time of a match from the data, which is in CEST, in UTC"""
+    kickoff_time = datetime.fromisoformat(f"{match['date']} {match['time']}")
+    return kickoff_time.replace(tzinfo=MATCH_TIME_ZONE).astimezone(timezone.utc)
+
+
+def sync_matches(matches):
+    """Create matches and reset changed ones, keyed by teams and kickoff time.
+
+    Matches that are completed and have been edited by hand are left alone.
+
+    Args:
+        matches (list): Dicts with the teams' FBR IDs and the kickoff date
+            and time.
+
+    Returns:
+        Counter: Number of matches inserted, updated, unchanged and skipped.
+    """
+    teams = {team.fbr_id: team for team in Team.objects.all()}
+    rounds = list(Round.objects.all())
+    existing = {
+        (m.home_team_id, m.away_team_id, m.kickoff_time, m.round_id): m
+        for m in Match.objects.all()
+    }
+    counts = Counter()
+
+    new_matches = []
+    changed_matches = []
+    for match in matches:
+        home_team = teams[match["home_team_id"]]
+        away_team = teams[match["away_team_id"]]
+        kickoff_time = get_kickoff_time(match)
+        content_hash = get_content_hash(match)
+
+        # Round is determined from the timestamp
+        round_obj = next(
+            (r for r in rounds if r.starts_at <= kickoff_time <= r.ends_at), None
+        )
+        if round_obj is None:
+            logger.warning(
+                f"Skipping match sync for {home_team.name} vs {away_team.name} at {kickoff_time}, which is in no round"
+            )
+            counts["skipped"] += 1
+            continue
+
+        key = (home_team.id, away_team.id, kickoff_time, round_obj.id)
+        current = existing.get(key)
+        if current is None:
+            new_matches.append(
+                Match(
+                    home_team=home_team,
+                    away_team=away_team,
+                    kickoff_time=kickoff_time,
+                    round=round_obj,
+                    content_hash=content_hash,
+                )
+            )
+        elif current.is_completed and current.is_manually_edited:
+            logger.info(
+                f"Skipping match sync for completed or manually edited match: {home_team.name} vs {away_team.name} at {kickoff_time}"
+            )
+            counts["skipped"] += 1
+        elif current.content_hash == content_hash:
+            counts["unchanged"] += 1
+        else:
+            # Matches are not completed or manually edited initially
+            current.is_completed = False
+            current.is_manually_edited = False
+            current.content_hash = content_hash
+            changed_matches.append(current)
+
+    Match.objects.bulk_create(new_matches)
+    Match.objects.bulk_update(
+        changed_matches, ["is_completed", "is_manually_edited", "content_hash"]
+    )
+    counts["inserted"] += len(new_matches)
+    counts["updated"] += len(changed_matches)
+    return counts
+
+
+def sync_match_ids(matches):
+    """Link matches to their FBR IDs, so live ingestion can follow them.
+
+    Upstream matches are paired with stored ones on the teams and the local
+    kickoff date, as the upstream kickoff time may be missing or moved.
+
+    Args:
+        matches (list): Matches from FBRAPIService.get_matches, with
+            "match_id", the teams' FBR IDs and "date".
+
+    Returns:
+        Counter: Number of matches updated and unchanged, and upstream
+            matches skipped for having no ID or no stored match.
+    """
+    stored = {
+        (
+            m.home_team.fbr_id,
+            m.away_team.fbr_id,
+            m.kickoff_time.astimezone(MATCH_TIME_ZONE).date().isoformat(),
+        ): m
+        for m in Match.objects.select_related("home_team", "away_team")
+    }
+    by_fbr_id = {m.fbr_id: m for m in stored.values() if m.fbr_id}
+    counts = Counter()
+
+    changed_matches = {}
+    for match in matches:
+        key = (match.get("home_team_id"), match.get("away_team_id"), match.get("date"))
+        current = stored.get(key)
+        if not match.get("match_id") or current is None:
+            logger.warning(
+                f"Cannot link upstream match {match.get('match_id')}: {match.get('home')} vs {match.get('away')} on {match.get('date')}"
+            )
+            counts["skipped"] += 1
+            continue
+        if current.fbr_id == match["match_id"]:
+            counts["unchanged"] += 1
+            continue
+
+        # The ID is unique, so take it from a match it was linked to before
+        previous = by_fbr_id.get(match["match_id"])
+        if previous is not None:
+            previous.fbr_id = None
+            changed_matches[previous.id] = previous
+        by_fbr_id.pop(current.fbr_id, None)
+        current.fbr_id = match["match_id"]
+        by_fbr_id[current.fbr_id] = current
+        changed_matches[current.id] = current
+        counts["updated"] += 1
+
+    # Clear the old IDs first, so no two rows ever share one
+    Match.objects.filter(id__in=changed_matches).update(fbr_id=None)
+    Match.objects.bulk_update(
+        [m for m in changed_matches.values() if m.fbr_id is not None], ["fbr_id"]
+    )
+    return counts
@@ -0,0 +1,91 @@
+from html.parser import HTMLParser
+
+# Rows inside a table body that repeat the header or separate groups
+SKIPPED_ROW_CLASSES = {"thead", "over_header", "spacer", "partial_table"}
+
+
+class TableRowParser(HTMLParser):
+    """Collects the body rows of one table in a page as it is fed.
+
+    Each row is a dict of cell text keyed by the cell's data-stat attribute,
+    as used by fbref.com, or by its column number if it has none. Header and
+    footer rows (such as "Squad Total") are left out.
+
+    Args:
+        table_index (int): Which table in the page to read, counting from 0.
+    """
+
+    def __init__(self, table_index=0):
+        super().__init__(convert_charrefs=True)
+        self.table_index = table_index
+        self.tables_seen = 0
+        self.depth = 0
+        self.in_body = False
+        self.done = False
+        self.rows = []
+        self.row = None
+        self.cell_key = None
+        self.cell_text = []
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == "table":
+            if self.depth:
+                self.depth += 1
+            elif self.tables_seen == self.table_index:
+                self.depth = 1
+            self.tables_seen += 1
+        elif self.depth != 1:
+            return
+        elif tag == "tbody":
+            self.in_body = True
+        elif tag == "tr" and self.in_body:
+            classes = set((dict(attrs).get("class") or "").split())
+            self.row = None if classes & SKIPPED_ROW_CLASSES else {}
+        elif tag in ("th", "td") and self.row is not None:
+            self.cell_key = dict(attrs).get("data-stat") or str(len(self.row))
+            self.cell_text = []
+
+    def handle_endtag(self, tag):
+        if self.done or not self.depth:
+            return
+        if tag == "table":
+            self.depth -= 1
+            self.done = not self.depth
+        elif self.depth != 1:
+            return
+        elif tag == "tbody":
+            self.in_body = False
+        elif tag in ("th", "td") and self.cell_key is not None:
+            self.row[self.cell_key] = "".join(self.cell_text).strip()
+            self.cell_key = None
+        elif tag == "tr" and self.row is not None:
+            if self.row:
+                self.rows.append(self.row)
+            self.row = None
+
+    def handle_data(self, data):
+        if self.cell_key is not None:
+            self.cell_text.append(data)
+
+
+def iter_table_rows(chunks, table_index=0):
+    """Yield the body rows of a table from HTML arriving in chunks.
+
+    Rows are yielded as soon as they are parsed, and the rest of the page is
+    skipped once the table ends.
+
+    Args:
+        chunks: Iterable of str pieces of the page.
+        table_index (int): Which table in the page to read, counting from 0.
+    """
+    parser = TableRowParser(table_index)
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from parser.rows
+        parser.rows.clear()
+        if parser.done:
+            break
+    parser.close()
+    yield from parser.rows
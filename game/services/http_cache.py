@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Response headers kept with a cached body
+CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+class ResponseCache:
+    """Cache of HTTP responses on disk, bounded in size.
+
+    Each response is stored as a body file and a small JSON file with its
+    headers and when it was fetched. Reading an entry marks it as recently
+    used, and once the cache grows past max_bytes the least recently used
+    entries are removed. Safe to share between threads.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+    def get_key(self, url, params=None):
+        """Name of the entry for a GET request"""
+        if params:
+            url = f"{url}?{urlencode(sorted(params.items()))}"
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def get(self, key):
+        """Load a cached response.
+
+        Returns:
+            tuple: The response and the age of the entry in seconds, or
+                (None, None) if nothing is cached.
+        """
+        meta_path = self.directory / f"{key}.json"
+        body_path = self.directory / f"{key}.body"
+        try:
+            meta = json.loads(meta_path.read_text())
+            body = body_path.read_bytes()
+        except (OSError, ValueError):
+            return None, None
+
+        # The body's access time tracks use, for evicting old entries
+        os.utime(body_path)
+
+        response = requests.Response()
+        response.status_code = 200
+        response.url = meta["url"]
+        response.headers = CaseInsensitiveDict(meta["headers"])
+        response.encoding = meta["encoding"]
+        response._content = body
+        response._content_consumed = True
+        return response, time.time() - meta["fetched_at"]
+
+    def set(self, key, response):
+        """Store a response, replacing any older copy"""
+        meta = {
+            "url": response.url,
+            "headers": {
+                name: response.headers[name]
+                for name in CACHED_HEADERS
+                if name in response.headers
+            },
+            "encoding": response.encoding,
+            "fetched_at": time.time(),
+        }
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Written to temporary files first so readers never see half an entry
+        self.write_file(f"{key}.body", response.content)
+        self.write_file(f"{key}.json", json.dumps(meta).encode())
+        self.evict()
+
+    def touch(self, key):
+        """Mark an entry as fetched now, after the server confirmed it's current"""
+        meta_path = self.directory / f"{key}.json"
+        try:
+            meta = json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            return
+        meta["fetched_at"] = time.time()
+        self.write_file(meta_path.name, json.dumps(meta).encode())
+
+    def write_file(self, name, content):
+        """Write a file in the cache directory atomically"""
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(temp_path, self.directory / name)
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits"""
+        with self.lock:
+            bodies = []
+            for path in self.directory.glob("*.body"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                bodies.append((stat.st_atime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in bodies)
+            for _, size, path in sorted(bodies):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                path.with_suffix(".json").unlink(missing_ok=True)
+                total -= size
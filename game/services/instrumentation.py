@@ -0,0 +1,101 @@
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import connection
+
+# Statements whose row counts are added to rows_written
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE")
+
+
+class PhaseTimer:
+    """Collects timings and database statistics for named phases.
+
+    Every measured block is kept as a record with its wall time, query count,
+    time spent in the database and rows written, labelled with the phase and
+    anything else passed to measure(). Blocks can be nested, for example a
+    phase and each batch of leagues inside it.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.records = []
+
+    @contextmanager
+    def measure(self, phase, **labels):
+        """Time the enclosed block and count the queries and writes it runs"""
+        stats = Counter()
+        # Some drivers only set the row count of a statement with RETURNING
+        # once its rows are fetched, so it's read when the next query starts
+        unfetched = []
+
+        def count_unfetched_rows():
+            while unfetched:
+                stats["rows_written"] += max(unfetched.pop().rowcount, 0)
+
+        def track_query(execute, sql, params, many, context):
+            count_unfetched_rows()
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                stats["db_seconds"] += time.perf_counter() - start
+                stats["queries"] += 1
+                if sql.lstrip()[:6].upper() in WRITE_STATEMENTS:
+                    if "RETURNING" in sql.upper():
+                        unfetched.append(context["cursor"])
+                    else:
+                        stats["rows_written"] += max(context["cursor"].rowcount, 0)
+
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(track_query):
+                yield stats
+        finally:
+            stats["seconds"] += time.perf_counter() - start
+            count_unfetched_rows()
+            self.add_record(phase, labels, stats)
+
+    def add_record(self, phase, labels, stats):
+        """Keep one measured block's stats and add them to the phase totals"""
+        self.records.append(
+            {
+                "phase": phase,
+                **labels,
+                "seconds": round(stats["seconds"], 4),
+                "queries": stats["queries"],
+                "db_seconds": round(stats["db_seconds"], 4),
+                "rows_written": stats["rows_written"],
+            }
+        )
+        if "leagues" not in labels:
+            totals = self.phases.setdefault(phase, Counter())
+            totals.update(stats)
+            totals["runs"] += 1
+
+    def merge(self, records, into=None):
+        """Add records measured in another process.
+
+        Args:
+            records: The other timer's records.
+            into: Stats of a block still being measured here, which the
+                records' database statistics are added to.
+        """
+        self.records.extend(records)
+        if into is not None:
+            for record in records:
+                into["queries"] += record["queries"]
+                into["db_seconds"] += record["db_seconds"]
+                into["rows_written"] += record["rows_written"]
+
+    def totals(self):
+        """Sum the stats of every phase"""
+        totals = Counter()
+        for stats in self.phases.values():
+            totals.update(stats)
+        return totals
+
+    def json_lines(self):
+        """Format every record as a line of JSON"""
+        return [json.dumps(record, default=str) for record in self.records]
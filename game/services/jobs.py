@@ -0,0 +1,102 @@
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from game.models import ProcessingJob
+
+# Failed jobs are claimed again until they have been tried this many times,
+# after which they wait to be queued again
+MAX_ATTEMPTS = 3
+
+# Jobs that must be done for a league before a job of the given kind runs
+JOB_DEPENDENCIES = {
+    ProcessingJob.COMPLETE_ROUND: ProcessingJob.SELECT_PLAYERS,
+}
+
+
+def enqueue_jobs(kind, round_obj, league_ids, requeue=False):
+    """Queue a job of the given kind for each league in a round.
+
+    Failed jobs go back in the queue. Finished jobs are left alone unless
+    requeue is set, which queues them to run again.
+
+    Returns:
+        int: Number of leagues given a new job.
+    """
+    existing = ProcessingJob.objects.filter(
+        kind=kind, round=round_obj, league_id__in=league_ids
+    )
+    existing_league_ids = set(existing.values_list("league_id", flat=True))
+
+    new_jobs = [
+        ProcessingJob(kind=kind, league_id=league_id, round=round_obj)
+        for league_id in league_ids
+        if league_id not in existing_league_ids
+    ]
+    # Another processor may queue the same jobs at the same time
+    ProcessingJob.objects.bulk_create(new_jobs, ignore_conflicts=True)
+
+    if existing_league_ids:
+        rerun = existing.filter(status=ProcessingJob.FAILED)
+        if requeue:
+            rerun = existing.exclude(status=ProcessingJob.PENDING)
+        rerun.update(status=ProcessingJob.PENDING)
+
+    return len(new_jobs)
+
+
+def claim_jobs(kind, round_obj, league_ids=None, limit=None):
+    """Lock the next runnable jobs, skipping jobs another worker holds.
+
+    Uses SELECT ... FOR UPDATE SKIP LOCKED, so it must be called inside a
+    transaction. The claimed jobs stay locked until that transaction ends; if
+    the worker dies the lock is released and the jobs are claimed again.
+
+    A job is held back while its league has an unfinished job of the kind it
+    depends on, so a league is never completed before it has been drafted.
+
+    Returns:
+        list: The claimed ProcessingJob objects, with their leagues loaded.
+    """
+    jobs = (
+        ProcessingJob.objects.select_for_update(skip_locked=True, of=("self",))
+        .filter(kind=kind, round=round_obj)
+        .filter(
+            Q(status=ProcessingJob.PENDING)
+            | Q(status=ProcessingJob.FAILED, attempts__lt=MAX_ATTEMPTS)
+        )
+        .select_related("league")
+        .order_by("id")
+    )
+    if league_ids is not None:
+        jobs = jobs.filter(league_id__in=league_ids)
+    if kind in JOB_DEPENDENCIES:
+        unfinished_dependencies = ProcessingJob.objects.filter(
+            kind=JOB_DEPENDENCIES[kind],
+            league=OuterRef("league"),
+            round=OuterRef("round"),
+        ).exclude(status=ProcessingJob.DONE)
+        jobs = jobs.exclude(Exists(unfinished_dependencies))
+    return list(jobs[:limit])
+
+
+def finish_jobs(jobs, started_at, error=None):
+    """Record the outcome and duration of claimed jobs"""
+    finished_at = timezone.now()
+    ProcessingJob.objects.filter(id__in=[job.id for job in jobs]).update(
+        status=ProcessingJob.FAILED if error else ProcessingJob.DONE,
+        attempts=F("attempts") + 1,
+        error=str(error) if error else "",
+        started_at=started_at,
+        finished_at=finished_at,
+        duration=finished_at - started_at,
+    )
+
+
+def count_done_jobs(kind, round_obj, league_ids=None):
+    """Count the leagues whose job of the given kind has finished"""
+    jobs = ProcessingJob.objects.filter(
+        kind=kind, round=round_obj, status=ProcessingJob.DONE
+    )
+    if league_ids is not None:
+        jobs = jobs.filter(league_id__in=league_ids)
+    return jobs.count()
@@ -0,0 +1,237 @@
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from game.models import Goal, Match, Player
+from game.services.round_events import notify_match_completed
+from game.services.scoring import (
+    apply_goal_changes,
+    get_round_goal_counts,
+    refresh_player_goals,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def get_live_matches(now=None):
+    """Matches to poll: kicked off, not completed and not edited by hand.
+
+    Only matches with an FBR ID can be followed upstream. A match is polled
+    for FBR_LIVE_MATCH_MINUTES after kickoff and then marked completed. If
+    that fails, because polls fail or a scorer can't be matched, polling goes
+    on for FBR_LIVE_GRACE_MINUTES more, after which the match is left for
+    the admin.
+
+    Returns:
+        list: (match, finished) pairs, where finished is set once the
+            match's window of FBR_LIVE_MATCH_MINUTES has passed, so the match
+            should be completed.
+    """
+    now = now or timezone.now()
+    window = timedelta(minutes=settings.FBR_LIVE_MATCH_MINUTES)
+    cutoff = window + timedelta(minutes=settings.FBR_LIVE_GRACE_MINUTES)
+    matches = Match.objects.filter(
+        fbr_id__isnull=False,
+        kickoff_time__lte=now,
+        kickoff_time__gt=now - cutoff,
+        is_completed=False,
+        is_manually_edited=False,
+    ).select_related("round", "home_team", "away_team")
+
+    return [(match, now >= match.kickoff_time + window) for match in matches]
+
+
+def get_unlinked_live_matches(now=None):
+    """Matches being played that can't be followed, as they have no FBR ID.
+
+    Their FBR IDs are set by sync_fbr_data, so these are matches the sync
+    couldn't pair with an upstream match.
+    """
+    now = now or timezone.now()
+    window = timedelta(minutes=settings.FBR_LIVE_MATCH_MINUTES)
+    return list(
+        Match.objects.filter(
+            fbr_id__isnull=True,
+            kickoff_time__lte=now,
+            kickoff_time__gt=now - window,
+            is_completed=False,
+            is_manually_edited=False,
+        ).select_related("home_team", "away_team")
+    )
+
+
+def get_next_kickoff(now=None):
+    """Kickoff time of the next match that can be followed live"""
+    now = now or timezone.now()
+    return (
+        Match.objects.filter(
+            fbr_id__isnull=False, kickoff_time__gt=now, is_manually_edited=False
+        )
+        .order_by("kickoff_time")
+        .values_list("kickoff_time", flat=True)
+        .first()
+    )
+
+
+def get_match_score(match):
+    """Home and away score from a match's goals, with own goals for the other side"""
+    home_goals = 0
+    away_goals = 0
+    for goal in match.goals.select_related("player"):
+        scored_for_home = goal.player.team_id == match.home_team_id
+        if goal.is_own_goal:
+            scored_for_home = not scored_for_home
+        if scored_for_home:
+            home_goals += 1
+        else:
+            away_goals += 1
+    return home_goals, away_goals
+
+
+def get_goal_events(match, team_stats, now=None):
+    """Goals of a match from its players' stats.
+
+    The stats only count each player's goals, so every goal is keyed on the
+    match, the player and its number among the player's goals, and a
+    player's first goals are taken to be their penalties. The minute isn't
+    known either, so it's the time since kickoff when the goal is first
+    seen. Own goals aren't in the stats and have to be entered in the admin.
+
+    Args:
+        match: The match the stats belong to.
+        team_stats (list): See FBRAPIService.get_match_player_stats.
+
+    Returns:
+        list: Dicts with "event_id", "player_id", "player_name", "minute" and
+            "is_penalty".
+    """
+    now = now or timezone.now()
+    minute = max(1, min(int((now - match.kickoff_time).total_seconds() // 60), 90))
+
+    goal_events = []
+    for team in team_stats:
+        for player in team.get("players", []):
+            meta_data = player.get("meta_data", {})
+            summary = player.get("stats", {}).get("summary", {})
+            goals = int(summary.get("gls") or 0)
+            penalties = int(summary.get("pk_made") or 0)
+            for number in range(1, goals + 1):
+                goal_events.append(
+                    {
+                        "event_id": f"{match.fbr_id}-{meta_data.get('player_id')}-{number}",
+                        "player_id": meta_data.get("player_id"),
+                        "player_name": meta_data.get("player_name"),
+                        "minute": minute,
+                        "is_penalty": number <= penalties,
+                    }
+                )
+    return goal_events
+
+
+def ingest_match_events(match, goal_events, finished=False):
+    """Bring a match's goals in line with its upstream goals.
+
+    Goals are keyed on their event ID, so ingesting the same goals again
+    changes nothing, and goals that have disappeared upstream (for example
+    after a VAR review) are removed. Standings are updated the same way as
+    when a result is entered in the admin. Nothing is saved, and the round
+    processor isn't woken, unless a goal or the match's completion changed.
+
+    Args:
+        match: The match the goals belong to.
+        goal_events (list): The match's goals, from get_goal_events.
+        finished (bool): Mark the match completed after these goals, unless
+            some scorers couldn't be matched.
+
+    Returns:
+        Counter: Goals added and removed, goals whose scorer couldn't be
+            matched to a player, and whether the match was completed.
+    """
+    counts = Counter()
+    goal_events = {str(event["event_id"]): event for event in goal_events}
+
+    players = Player.objects.filter(
+        team_id__in=[match.home_team_id, match.away_team_id]
+    )
+    players_by_fbr_id = {p.fbr_id: p for p in players if p.fbr_id}
+    players_by_name = {p.name: p for p in players}
+
+    with transaction.atomic():
+        # Lock the match so a result entered in the admin meanwhile wins
+        match = (
+            Match.objects.select_for_update(of=("self",))
+            .select_related("round")
+            .get(id=match.id)
+        )
+        if match.is_manually_edited:
+            logger.info(f"Skipping live goals for manually edited match {match}")
+            return counts
+
+        ingested = dict(
+            match.goals.filter(fbr_event_id__isnull=False).values_list(
+                "fbr_event_id", "player_id"
+            )
+        )
+
+        new_goals = []
+        for event_id, event in goal_events.items():
+            if event_id in ingested:
+                continue
+            player = players_by_fbr_id.get(
+                event.get("player_id")
+            ) or players_by_name.get(event.get("player_name"))
+            if player is None:
+                logger.warning(
+                    f"No player found for goal {event_id} in {match}: {event.get('player_name')}"
+                )
+                counts["unmatched"] += 1
+                continue
+            new_goals.append(
+                Goal(
+                    match=match,
+                    player=player,
+                    minute=event["minute"],
+                    is_penalty=event.get("is_penalty", False),
+                    fbr_event_id=event_id,
+                )
+            )
+        removed_event_ids = set(ingested) - set(goal_events)
+
+        # A goal that couldn't be matched keeps the match live until it's fixed
+        is_completed = finished and not counts["unmatched"]
+        if (
+            not new_goals
+            and not removed_event_ids
+            and is_completed == match.is_completed
+        ):
+            return counts
+
+        # Players whose goal counts may change with these goals
+        player_ids = {goal.player_id for goal in new_goals}
+        player_ids |= {ingested[event_id] for event_id in removed_event_ids}
+        goal_counts_before = get_round_goal_counts(match.round, player_ids)
+
+        Goal.objects.filter(fbr_event_id__in=removed_event_ids).delete()
+        # Another poller may have ingested the same goals already
+        Goal.objects.bulk_create(new_goals, ignore_conflicts=True)
+
+        match.home_score, match.away_score = get_match_score(match)
+        match.is_completed = is_completed
+        match.save(update_fields=["home_score", "away_score", "is_completed"])
+
+        if player_ids:
+            # Shift standings by the change in goals instead of re-scoring
+            apply_goal_changes(match.round, player_ids, goal_counts_before)
+            refresh_player_goals(player_ids)
+
+        # Wake the round processor so standings follow the match
+        notify_match_completed(match)
+
+    counts["added"] = len(new_goals)
+    counts["removed"] = len(removed_event_ids)
+    counts["completed"] = int(is_completed)
+    return counts
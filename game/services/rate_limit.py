@@ -0,0 +1,60 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """Token bucket that spaces out requests to one host.
+
+    Tokens are added at a steady rate up to the bucket's capacity, and each
+    request takes one, so short bursts are allowed but the average rate never
+    exceeds the limit. Safe to share between threads.
+    """
+
+    def __init__(self, per_minute, burst=1):
+        self.rate = per_minute / 60
+        self.capacity = max(burst, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until a token is available and take it.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        waited = 0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class HostRateLimiter:
+    """One token bucket per host, shared by every request to that host.
+
+    Args:
+        limits (dict): Maps a host name to a dict with "per_minute" and
+            optionally "burst". Hosts without a limit aren't throttled.
+    """
+
+    def __init__(self, limits):
+        self.buckets = {
+            host: TokenBucket(limit["per_minute"], limit.get("burst", 1))
+            for host, limit in limits.items()
+        }
+
+    def acquire(self, url):
+        """Wait for the rate limit of the URL's host, if it has one"""
+        bucket = self.buckets.get(urlsplit(url).hostname)
+        return bucket.acquire() if bucket else 0
@@ -0,0 +1,63 @@
+import logging
+import select
+import time
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Postgres NOTIFY channel used to wake the round processor
+MATCH_COMPLETED_CHANNEL = "match_completed"
+
+# How long to sleep at a time when the database can't deliver notifications
+FALLBACK_POLL_SECONDS = 60
+
+
+def notify_match_completed(match):
+    """Tell any waiting round processor that a match result was entered.
+
+    The notification is delivered when the surrounding transaction commits.
+    Only Postgres supports this; on other databases this does nothing and the
+    round processor falls back to periodic wake-ups.
+    """
+    if connection.vendor != "postgresql":
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_notify(%s, %s)", [MATCH_COMPLETED_CHANNEL, str(match.id)]
+        )
+
+
+def wait_for_match_completed(timeout):
+    """Block until a match is completed or the timeout (in seconds) expires.
+
+    Returns:
+        list: IDs of the matches that were completed, empty on timeout.
+    """
+    timeout = max(timeout, 0)
+
+    if connection.vendor != "postgresql":
+        time.sleep(min(timeout, FALLBACK_POLL_SECONDS))
+        return []
+
+    # LISTEN again in case the connection was replaced since the last wait
+    connection.ensure_connection()
+    with connection.cursor() as cursor:
+        cursor.execute(f"LISTEN {MATCH_COMPLETED_CHANNEL}")
+
+    pg_connection = connection.connection
+    # Any query, including the LISTEN above, moves notifications that arrived
+    # while the processor was busy into notifies, where select() can't see them
+    pg_connection.poll()
+    if not pg_connection.notifies:
+        if select.select([pg_connection], [], [], timeout) == ([], [], []):
+            return []
+        pg_connection.poll()
+
+    match_ids = []
+    while pg_connection.notifies:
+        notify = pg_connection.notifies.pop(0)
+        logger.info(f"Received {notify.channel} notification: {notify.payload}")
+        match_ids.append(notify.payload)
+    return match_ids
@@ -0,0 +1,451 @@
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import connection
+from django.db.models import Case, Count, F, Q, Sum, When, Window
+from django.db.models.functions import Rank, RowNumber
+
+from game.models import Goal, League, LeagueStanding, Player, Round, UserSelection
+from game.services.selections import discard_pending_selection_orders
+from game.services.sharding import lock_league_rounds
+
+# How update_league_positions ranks users on equal points
+TIES_ORDINAL = "ordinal"
+TIES_COMPETITION = "competition"
+
+
+def get_round_goal_counts(round_obj, player_ids=None):
+    """Count goals (excluding own goals) per player for a round in one query.
+
+    Args:
+        round_obj: The round to count goals for.
+        player_ids: Only count goals for these players. Defaults to everyone.
+
+    Returns:
+        dict: Mapping of player ID to the number of goals scored in the round.
+    """
+    goals = Goal.objects.filter(match__round=round_obj, is_own_goal=False)
+    if player_ids is not None:
+        goals = goals.filter(player_id__in=player_ids)
+
+    goal_counts = goals.values("player_id").annotate(goals=Count("id"))
+    return {row["player_id"]: row["goals"] for row in goal_counts}
+
+
+def get_player_goal_counts(player_ids=None):
+    """Count tournament goals (excluding own goals) per player in one query.
+
+    Returns:
+        dict: Mapping of player ID to goals scored. Players without goals are
+        left out.
+    """
+    goals = Goal.objects.filter(is_own_goal=False)
+    if player_ids is not None:
+        goals = goals.filter(player_id__in=player_ids)
+
+    goal_counts = goals.order_by().values("player_id").annotate(goals=Count("id"))
+    return {row["player_id"]: row["goals"] for row in goal_counts}
+
+
+def refresh_player_goals(player_ids=None):
+    """Recompute Player.goals_scored from the goals table in one statement.
+
+    Runs a single UPDATE ... FROM a per-player COUNT(*) of goals (own goals
+    excluded). Only players whose tally differs are written, and players
+    whose goals were all removed go back to zero.
+
+    Args:
+        player_ids: Players to refresh. Defaults to every player.
+
+    Returns:
+        list: (player ID, name, goals scored) for every player that changed,
+        ordered by name.
+    """
+    if player_ids is not None:
+        player_ids = list(player_ids)
+        if not player_ids:
+            return []
+
+    player_table = Player._meta.db_table
+    goal_table = Goal._meta.db_table
+    params = [False]
+    player_filter = ""
+    if player_ids is not None:
+        player_filter = f"AND p.id IN ({', '.join(['%s'] * len(player_ids))})"
+        params.extend(player_ids)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {player_table}
+            SET goals_scored = COALESCE(tally.goals, 0)
+            FROM {player_table} p
+            LEFT JOIN (
+                SELECT player_id, COUNT(*) AS goals
+                FROM {goal_table}
+                WHERE is_own_goal = %s
+                GROUP BY player_id
+            ) tally ON tally.player_id = p.id
+            WHERE {player_table}.id = p.id
+            AND {player_table}.goals_scored <> COALESCE(tally.goals, 0)
+            {player_filter}
+            RETURNING {player_table}.id, {player_table}.name,
+                {player_table}.goals_scored
+            """,
+            params,
+        )
+        return sorted(cursor.fetchall(), key=lambda row: row[1])
+
+
+def get_round_selections(round_obj, leagues):
+    """Load the confirmed selections for a round, grouped by league.
+
+    Returns:
+        dict: Mapping of league ID to a list of UserSelection objects, in the
+        model's default ordering (user, then selection order).
+    """
+    selections = UserSelection.objects.filter(
+        round=round_obj, league__in=leagues
+    ).select_related("user", "player")
+
+    selections_by_league = {}
+    for selection in selections:
+        selections_by_league.setdefault(selection.league_id, []).append(selection)
+    return selections_by_league
+
+
+def get_previous_totals(round_obj, leagues):
+    """Get each user's cumulative points from all rounds before a round.
+
+    The totals are summed from the per-round points in one aggregate query,
+    rather than read from each user's latest standing.
+
+    Returns:
+        dict: Mapping of (league ID, user ID) to the previous total points.
+    """
+    previous_totals = (
+        LeagueStanding.objects.filter(
+            league__in=leagues, round__number__lt=round_obj.number
+        )
+        .order_by()
+        .values("league_id", "user_id")
+        .annotate(total=Sum("points"))
+    )
+    return {(row["league_id"], row["user_id"]): row["total"] for row in previous_totals}
+
+
+def get_running_totals(leagues):
+    """Load the standings history of leagues with running totals.
+
+    Each standing is annotated with ``running_total``: the user's points summed
+    over every round up to and including the standing's round, computed with
+    a window function in a single query.
+
+    Returns:
+        QuerySet: LeagueStanding objects ordered by league, user and round.
+    """
+    return (
+        LeagueStanding.objects.filter(league__in=leagues)
+        .annotate(
+            running_total=Window(
+                expression=Sum("points"),
+                partition_by=[F("league_id"), F("user_id")],
+                order_by=F("round__number").asc(),
+            )
+        )
+        .order_by("league_id", "user_id", "round__number")
+    )
+
+
+def rebuild_league_totals(leagues, dry_run=False):
+    """Recompute total_points for every round of the given leagues.
+
+    The whole history is read in one query and only standings whose total
+    changed are written back. Positions are then recomputed for the affected
+    rounds. The leagues' round locks are held for every round, so this must
+    be called inside a transaction.
+
+    Args:
+        leagues: Leagues to rebuild.
+        dry_run (bool): Find the changed totals without writing them.
+
+    Returns:
+        list: The standings whose total changed, with the new total and the
+            old one in old_total_points.
+    """
+    lock_league_rounds(
+        [league.id for league in leagues], Round.objects.values_list("id", flat=True)
+    )
+
+    changed = []
+    for standing in get_running_totals(leagues).only(
+        "id", "league_id", "user_id", "round_id", "total_points"
+    ):
+        if standing.total_points != standing.running_total:
+            standing.old_total_points = standing.total_points
+            standing.total_points = standing.running_total
+            changed.append(standing)
+
+    if dry_run or not changed:
+        return changed
+
+    LeagueStanding.objects.bulk_update(changed, ["total_points"], batch_size=1000)
+    for round_id in {standing.round_id for standing in changed}:
+        update_league_positions(round_id, leagues)
+
+    # Precomputed orders for upcoming rounds were based on the old totals
+    first_round = (
+        Round.objects.filter(id__in={standing.round_id for standing in changed})
+        .order_by("number")
+        .first()
+    )
+    discard_pending_selection_orders(first_round, leagues)
+
+    return changed
+
+
+def get_unscored_league_ids(round_obj, leagues):
+    """Get the leagues where some users have selections but no standing.
+
+    Returns:
+        set: IDs of the leagues that still need scoring for the round.
+    """
+    users_with_selections = set(
+        UserSelection.objects.filter(round=round_obj, league__in=leagues)
+        .order_by()
+        .values_list("league_id", "user_id")
+    )
+    users_with_standings = set(
+        LeagueStanding.objects.filter(round=round_obj, league__in=leagues)
+        .order_by()
+        .values_list("league_id", "user_id")
+    )
+    return {league_id for league_id, _ in users_with_selections - users_with_standings}
+
+
+def calculate_user_points(selections, goal_counts):
+    """Sum the round goals of each user's selected players.
+
+    Users are returned in the order they first appear in ``selections``.
+
+    Returns:
+        dict: Mapping of User to points scored in the round.
+    """
+    user_points = {}
+    for selection in selections:
+        user_points.setdefault(selection.user, 0)
+        user_points[selection.user] += goal_counts.get(selection.player_id, 0)
+    return user_points
+
+
+def score_leagues(round_obj, leagues):
+    """Build the standings for a round from scratch for the given leagues.
+
+    Leagues without any selections for the round are skipped.
+
+    Returns:
+        list: Unsaved LeagueStanding objects.
+    """
+    goal_counts = get_round_goal_counts(round_obj)
+    selections_by_league = get_round_selections(round_obj, leagues)
+    previous_totals = get_previous_totals(round_obj, leagues)
+
+    standings = []
+    for league in leagues:
+        user_selections = selections_by_league.get(league.id)
+        if not user_selections:
+            continue
+
+        user_points = calculate_user_points(user_selections, goal_counts)
+        for user, points in user_points.items():
+            previous_total = previous_totals.get((league.id, user.id), 0)
+            standings.append(
+                LeagueStanding(
+                    league=league,
+                    user=user,
+                    round=round_obj,
+                    points=points,
+                    total_points=previous_total + points,
+                )
+            )
+    return standings
+
+
+def apply_goal_deltas(round_obj, goal_deltas):
+    """Adjust standings after some players' goal counts for a round changed.
+
+    Only the selections of the affected players are looked at. Their owners'
+    points for the round, and their totals for the round and every later
+    round, are shifted by the change. Users who have selections but no
+    standing yet for the round have their leagues scored from scratch.
+
+    The affected leagues' round locks are held from this round on, so this
+    must be called inside a transaction.
+
+    Args:
+        round_obj: The round the goals were scored in.
+        goal_deltas: Mapping of player ID to the change in their goal count.
+
+    Returns:
+        set: IDs of the leagues whose standings changed.
+    """
+    goal_deltas = {
+        player_id: delta for player_id, delta in goal_deltas.items() if delta
+    }
+    if not goal_deltas:
+        return set()
+
+    user_deltas = defaultdict(int)
+    for league_id, user_id, player_id in UserSelection.objects.filter(
+        round=round_obj, player_id__in=goal_deltas
+    ).values_list("league_id", "user_id", "player_id"):
+        user_deltas[(league_id, user_id)] += goal_deltas[player_id]
+
+    if not user_deltas:
+        return set()
+
+    league_ids = {league_id for league_id, _ in user_deltas}
+    # Wait for any processor scoring these leagues, so it can't overwrite the
+    # change with standings computed from the old goals
+    lock_league_rounds(
+        league_ids,
+        Round.objects.filter(number__gte=round_obj.number).values_list("id", flat=True),
+    )
+    existing_standings = set(
+        LeagueStanding.objects.filter(
+            round=round_obj, league_id__in=league_ids
+        ).values_list("league_id", "user_id")
+    )
+
+    # Users with the same delta are updated together in one statement
+    users_by_delta = defaultdict(list)
+    unscored_league_ids = set()
+    for key, delta in user_deltas.items():
+        if key not in existing_standings:
+            unscored_league_ids.add(key[0])
+        elif delta:
+            users_by_delta[delta].append(key)
+
+    for delta, keys in users_by_delta.items():
+        LeagueStanding.objects.filter(
+            reduce(
+                or_,
+                (
+                    Q(league_id=league_id, user_id=user_id)
+                    for league_id, user_id in keys
+                ),
+            ),
+            round__number__gte=round_obj.number,
+        ).update(
+            points=Case(
+                When(round=round_obj, then=F("points") + delta),
+                default=F("points"),
+            ),
+            total_points=F("total_points") + delta,
+        )
+
+    if unscored_league_ids:
+        leagues = list(League.objects.filter(id__in=unscored_league_ids))
+        save_standings(score_leagues(round_obj, leagues))
+
+    changed_league_ids = unscored_league_ids | {
+        league_id for keys in users_by_delta.values() for league_id, _ in keys
+    }
+    # Totals of later rounds moved too, so their positions may have changed
+    for round_id in (
+        LeagueStanding.objects.filter(
+            league_id__in=changed_league_ids, round__number__gte=round_obj.number
+        )
+        .order_by("round_id")
+        .values_list("round_id", flat=True)
+        .distinct()
+    ):
+        update_league_positions(round_id, changed_league_ids)
+
+    # Precomputed orders for upcoming rounds were based on the old totals
+    if changed_league_ids:
+        discard_pending_selection_orders(round_obj, changed_league_ids)
+
+    return changed_league_ids
+
+
+def apply_goal_changes(round_obj, player_ids, goal_counts_before):
+    """Re-score standings after goals for some players were added or removed.
+
+    Args:
+        round_obj: The round the goals were scored in.
+        player_ids: Players whose goals may have changed.
+        goal_counts_before: Result of get_round_goal_counts for those players,
+            taken before the goals were changed.
+
+    Returns:
+        set: IDs of the leagues whose standings changed.
+    """
+    goal_counts_after = get_round_goal_counts(round_obj, player_ids)
+    goal_deltas = {
+        player_id: goal_counts_after.get(player_id, 0)
+        - goal_counts_before.get(player_id, 0)
+        for player_id in player_ids
+    }
+    return apply_goal_deltas(round_obj, goal_deltas)
+
+
+def update_league_positions(round_obj, leagues=None, ties=TIES_ORDINAL):
+    """Recompute standing positions for a round with a window function.
+
+    Positions are ranked within each league by total points. With
+    TIES_ORDINAL, users on equal points are ordered by username, so every
+    position is distinct (1, 2, 3, 4). With TIES_COMPETITION, users on equal
+    points share a position and the next one is skipped (1, 2, 2, 4).
+
+    Only rows whose position changed are written, in one bulk_update.
+
+    Args:
+        round_obj: The round (or round ID) to rank.
+        leagues: Leagues (or league IDs) to rank. Defaults to every league.
+        ties: How to rank users on equal points.
+
+    Returns:
+        int: Number of standings whose position changed.
+    """
+    if ties == TIES_ORDINAL:
+        rank = RowNumber()
+        order_by = [F("total_points").desc(), F("user__username").asc()]
+    elif ties == TIES_COMPETITION:
+        rank = Rank()
+        order_by = [F("total_points").desc()]
+    else:
+        raise ValueError(f"Unknown tie handling: {ties}")
+
+    standings = LeagueStanding.objects.filter(round=round_obj)
+    if leagues is not None:
+        standings = standings.filter(league__in=leagues)
+
+    standings = standings.annotate(
+        new_position=Window(
+            expression=rank, partition_by=[F("league_id")], order_by=order_by
+        )
+    ).only("id", "position")
+
+    changed = []
+    for standing in standings:
+        if standing.position != standing.new_position:
+            standing.position = standing.new_position
+            changed.append(standing)
+
+    LeagueStanding.objects.bulk_update(changed, ["position"], batch_size=1000)
+    return len(changed)
+
+
+def save_standings(standings):
+    """Insert or update LeagueStanding rows in a single statement"""
+    if not standings:
+        return []
+
+    return LeagueStanding.objects.bulk_create(
+        standings,
+        update_conflicts=True,
+        unique_fields=["league", "user", "round"],
+        update_fields=["points", "total_points"],
+    )
@@ -0,0 +1,343 @@
+import random
+
+from django.db import connection
+from django.db.models import DateTimeField, Exists, IntegerField, OuterRef, Value
+from django.utils import timezone
+
+from game.models import (
+    LeagueParticipant,
+    LeagueStanding,
+    ProvisionalSelection,
+    SelectionOrder,
+    UserSelection,
+)
+
+# Number of players each user gets to pick per round
+PLAYERS_PER_ROUND = 3
+
+
+def load_selection_orders(round_obj, leagues):
+    """Load the selection order for a round, grouped by league.
+
+    Returns:
+        dict: Mapping of league ID to a list of SelectionOrder objects, in pick
+        order.
+    """
+    selection_orders = (
+        SelectionOrder.objects.filter(round=round_obj, league__in=leagues)
+        .select_related("user")
+        .order_by("league", "order")
+    )
+
+    orders_by_league = {}
+    for selection_order in selection_orders:
+        orders_by_league.setdefault(selection_order.league_id, []).append(
+            selection_order
+        )
+    return orders_by_league
+
+
+def get_leagues_with_selection_orders(round_obj, leagues):
+    """Get the IDs of the leagues that already have an order for the round"""
+    return set(
+        SelectionOrder.objects.filter(round=round_obj, league__in=leagues)
+        .order_by()
+        .values_list("league_id", flat=True)
+        .distinct()
+    )
+
+
+def load_round_totals(round_obj, leagues):
+    """Load the total points of every standing in a round.
+
+    Returns:
+        dict: Mapping of (league ID, user ID) to total points.
+    """
+    standings = LeagueStanding.objects.filter(
+        round=round_obj, league__in=leagues
+    ).values_list("league_id", "user_id", "total_points")
+    return {
+        (league_id, user_id): total_points
+        for league_id, user_id, total_points in standings
+    }
+
+
+def build_selection_orders(round_obj, leagues, previous_totals=None, seeds=None):
+    """Build the selection order for a round in every given league.
+
+    Users pick in order of their previous total points, lowest first, with
+    ties broken at random. Participants without a previous standing pick
+    last, in the order they joined. Without previous totals (the first
+    round) the whole order is random.
+
+    Each league's shuffle uses its own seed, which is stored on the orders so
+    the same order can be rebuilt later by passing the seeds back in.
+
+    Args:
+        round_obj: The round to build orders for.
+        leagues: Leagues to build orders for.
+        previous_totals: Result of load_round_totals for the previous round,
+            or None to order everyone at random.
+        seeds: Optional mapping of league ID to the seed to use.
+
+    Returns:
+        dict: Mapping of league ID to a list of unsaved SelectionOrder
+        objects, in pick order.
+    """
+    participants = (
+        LeagueParticipant.objects.filter(league__in=leagues)
+        .select_related("user")
+        .order_by("joined_at", "id")
+    )
+    users_by_league = {}
+    for participant in participants:
+        users_by_league.setdefault(participant.league_id, []).append(participant.user)
+
+    orders_by_league = {}
+    for league in leagues:
+        seed = (seeds or {}).get(league.id)
+        if seed is None:
+            seed = random.getrandbits(32)
+        rng = random.Random(seed)
+        users = users_by_league.get(league.id, [])
+
+        if previous_totals is None:
+            ordered_users = sorted(users, key=lambda user: user.id)
+            rng.shuffle(ordered_users)
+        else:
+            # Group by previous total points for tie-breaking
+            points_groups = {}
+            newcomers = []
+            for user in users:
+                points = previous_totals.get((league.id, user.id))
+                if points is None:
+                    newcomers.append(user)
+                else:
+                    points_groups.setdefault(points, []).append(user)
+
+            ordered_users = []
+            for points in sorted(points_groups):  # Lowest to highest
+                tied_users = sorted(points_groups[points], key=lambda user: user.id)
+                rng.shuffle(tied_users)
+                ordered_users.extend(tied_users)
+            ordered_users.extend(newcomers)
+
+        orders_by_league[league.id] = [
+            SelectionOrder(
+                league=league, round=round_obj, user=user, order=i + 1, seed=seed
+            )
+            for i, user in enumerate(ordered_users)
+        ]
+    return orders_by_league
+
+
+def build_missing_selection_orders(round_obj, leagues, orders_by_league):
+    """Extend stored selection orders with participants missing from them.
+
+    Orders are built when the previous round completes, so anyone who joins
+    a league after that isn't in its order. They are added after everyone
+    else in the order they joined, the same place build_selection_orders
+    puts participants without a previous standing.
+
+    Args:
+        round_obj: The round the orders are for.
+        leagues: Leagues whose orders to extend.
+        orders_by_league: Result of load_selection_orders for the leagues.
+
+    Returns:
+        dict: Mapping of league ID to a list of unsaved SelectionOrder
+        objects for the missing participants, for leagues that have any.
+    """
+    participants = (
+        LeagueParticipant.objects.filter(league__in=leagues)
+        .select_related("user")
+        .order_by("joined_at", "id")
+    )
+    ordered_users = {
+        (league_id, selection_order.user_id)
+        for league_id, selection_orders in orders_by_league.items()
+        for selection_order in selection_orders
+    }
+    leagues_by_id = {league.id: league for league in leagues}
+
+    missing_by_league = {}
+    for participant in participants:
+        if (participant.league_id, participant.user_id) in ordered_users:
+            continue
+        selection_orders = orders_by_league[participant.league_id]
+        missing = missing_by_league.setdefault(participant.league_id, [])
+        missing.append(
+            SelectionOrder(
+                league=leagues_by_id[participant.league_id],
+                round=round_obj,
+                user=participant.user,
+                order=len(selection_orders) + len(missing) + 1,
+                seed=selection_orders[0].seed,
+            )
+        )
+    return missing_by_league
+
+
+def discard_pending_selection_orders(round_obj, leagues):
+    """Delete precomputed orders that depend on a round's standings.
+
+    Orders for later rounds whose selection is still open are removed, so
+    they are rebuilt from the corrected standings when selection closes.
+
+    Returns:
+        int: Number of orders deleted.
+    """
+    deleted, _ = SelectionOrder.objects.filter(
+        league__in=leagues,
+        round__number__gt=round_obj.number,
+        round__selection_closes__gt=timezone.now(),
+    ).delete()
+    return deleted
+
+
+def load_provisional_lists(rounds, leagues):
+    """Load provisional selection lists for one or more rounds.
+
+    Returns:
+        dict: Mapping of (league ID, user ID, round ID) to a list of
+        ProvisionalSelection objects ordered by priority.
+    """
+    provisional_selections = (
+        ProvisionalSelection.objects.filter(
+            round__in=[r for r in rounds if r], league__in=leagues
+        )
+        .select_related("player")
+        .order_by("priority")
+    )
+
+    provisional_lists = {}
+    for provisional in provisional_selections:
+        key = (provisional.league_id, provisional.user_id, provisional.round_id)
+        provisional_lists.setdefault(key, []).append(provisional)
+    return provisional_lists
+
+
+def get_users_with_selections(round_obj, leagues):
+    """Get the (league ID, user ID) pairs that already have selections"""
+    return set(
+        UserSelection.objects.filter(round=round_obj, league__in=leagues)
+        .values_list("league_id", "user_id")
+        .distinct()
+    )
+
+
+def get_selected_players(round_obj, leagues):
+    """Get the players already picked for a round, grouped by league.
+
+    Returns:
+        dict: Mapping of league ID to a set of player IDs.
+    """
+    selected_players = {}
+    for league_id, player_id in (
+        UserSelection.objects.filter(round=round_obj, league__in=leagues)
+        .order_by()
+        .values_list("league_id", "player_id")
+    ):
+        selected_players.setdefault(league_id, set()).add(player_id)
+    return selected_players
+
+
+def get_lists_to_copy(round_obj, previous_round, leagues):
+    """Get the previous round's provisional selections that need copying.
+
+    A list is copied for every participant who has neither a provisional
+    list nor confirmed selections for the round.
+
+    Returns:
+        QuerySet: ProvisionalSelection rows from the previous round.
+    """
+    same_user = {"league": OuterRef("league"), "user": OuterRef("user")}
+    return (
+        ProvisionalSelection.objects.filter(round=previous_round, league__in=leagues)
+        .filter(Exists(LeagueParticipant.objects.filter(**same_user)))
+        .exclude(
+            Exists(ProvisionalSelection.objects.filter(round=round_obj, **same_user))
+        )
+        .exclude(Exists(UserSelection.objects.filter(round=round_obj, **same_user)))
+        .order_by()
+    )
+
+
+def copy_missing_provisional_lists(round_obj, previous_round, leagues):
+    """Copy last round's provisional lists for users who didn't submit one.
+
+    Every affected user in every given league is handled by a single
+    INSERT ... SELECT, so no rows pass through Python.
+
+    Returns:
+        int: Number of provisional selections copied.
+    """
+    if previous_round is None:
+        return 0
+
+    now = timezone.now()
+    source = get_lists_to_copy(round_obj, previous_round, leagues).values_list(
+        "user_id",
+        "league_id",
+        "player_id",
+        "priority",
+        Value(round_obj.id, output_field=IntegerField()),
+        Value(now, output_field=DateTimeField()),
+        Value(now, output_field=DateTimeField()),
+    )
+    select_sql, params = source.query.sql_with_params()
+
+    table = ProvisionalSelection._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} "
+            "(user_id, league_id, player_id, priority, round_id, created_at, updated_at) "
+            f"{select_sql}",
+            params,
+        )
+        return cursor.rowcount
+
+
+def copy_provisional_list(provisional_list, round_obj):
+    """Copy a provisional list into another round, keeping priorities.
+
+    The copies are not saved.
+    """
+    return [
+        ProvisionalSelection(
+            user_id=provisional.user_id,
+            league_id=provisional.league_id,
+            round=round_obj,
+            player=provisional.player,
+            priority=provisional.priority,
+        )
+        for provisional in provisional_list
+    ]
+
+
+def pick_players(provisional_list, selected_players, limit=PLAYERS_PER_ROUND):
+    """Pick the highest priority players that are still available.
+
+    Args:
+        provisional_list: The user's provisional selections, by priority.
+        selected_players: IDs of players already picked in the league. Picked
+            players are added to this set.
+        limit: Maximum number of players to pick.
+
+    Returns:
+        list: The picked Player objects, in pick order.
+    """
+    picked = []
+    for provisional in provisional_list:
+        if len(picked) >= limit:
+            break
+        if provisional.player_id not in selected_players:
+            picked.append(provisional.player)
+            selected_players.add(provisional.player_id)
+    return picked
+
+
+def save_selections(user_selections):
+    """Persist confirmed selections"""
+    if user_selections:
+        UserSelection.objects.bulk_create(user_selections)
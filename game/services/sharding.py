@@ -0,0 +1,60 @@
+import argparse
+
+from django.db import connection
+
+
+def parse_shard(value):
+    """Parse a --shard value of the form "i/N" into (i, N)"""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Invalid shard {value!r}, expected i/N such as 0/2"
+        )
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(
+            f"Invalid shard {value!r}, i must be between 0 and N - 1"
+        )
+    return index, count
+
+
+def in_shard(league_id, shard):
+    """Check whether a league belongs to a shard.
+
+    Leagues are spread across shards by their UUID, so every replica agrees
+    on the split without coordinating.
+    """
+    if shard is None:
+        return True
+    index, count = shard
+    return league_id.int % count == index
+
+
+def lock_league_round(league_id, round_id):
+    """Take the advisory lock for processing a league's round.
+
+    The lock is held until the current transaction ends, so this must be
+    called inside one. If another processor holds the lock this waits for it
+    to commit, so the caller then sees that processor's writes instead of
+    repeating them. Outside PostgreSQL there are no advisory locks and this
+    does nothing.
+    """
+    if connection.vendor != "postgresql":
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock(%s, %s)",
+            [round_id, league_id.int % 2**31],
+        )
+
+
+def lock_league_rounds(league_ids, round_ids):
+    """Take the round locks of several leagues and rounds.
+
+    Locks are taken in league ID order, like process_round takes them, so
+    the two can't deadlock.
+    """
+    for league_id in sorted(league_ids):
+        for round_id in sorted(round_ids):
+            lock_league_round(league_id, round_id)
@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+import pytest
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from game.models import (
+    League,
+    LeagueParticipant,
+    LeagueStanding,
+    Match,
+    Player,
+    Round,
+    Team,
+    UserSelection,
+)
+
+
+@pytest.fixture
+def teams():
+    return [
+        Team.objects.create(name=name, country=name, fbr_id=name.lower())
+        for name in ("Spain", "England")
+    ]
+
+
+@pytest.fixture
+def players(teams):
+    return [
+        Player.objects.create(name=f"Player {i}", team=teams[i % 2], position="FW")
+        for i in range(4)
+    ]
+
+
+@pytest.fixture
+def make_round():
+    def make_round(number, **fields):
+        starts_at = timezone.now() - timedelta(days=30) + timedelta(days=7 * number)
+        return Round.objects.create(
+            number=number,
+            name=f"Round {number}",
+            selection_opens=starts_at - timedelta(days=2),
+            selection_closes=starts_at - timedelta(days=1),
+            starts_at=starts_at,
+            ends_at=starts_at + timedelta(days=5),
+            **fields,
+        )
+
+    return make_round
+
+
+@pytest.fixture
+def users():
+    return [User.objects.create(username=name) for name in ("alice", "bob", "carol")]
+
+
+@pytest.fixture
+def make_league(users):
+    def make_league(code, members):
+        league = League.objects.create(name=code, code=code, created_by=users[0])
+        for user in members:
+            LeagueParticipant.objects.create(league=league, user=user)
+        return league
+
+    return make_league
+
+
+@pytest.fixture
+def make_match(teams):
+    def make_match(round_obj):
+        return Match.objects.create(
+            round=round_obj,
+            home_team=teams[0],
+            away_team=teams[1],
+            kickoff_time=round_obj.starts_at,
+            is_completed=True,
+        )
+
+    return make_match
+
+
+@pytest.fixture
+def select():
+    def select(user, league, round_obj, player):
+        return UserSelection.objects.create(
+            user=user,
+            league=league,
+            round=round_obj,
+            player=player,
+            selection_order=1,
+        )
+
+    return select
+
+
+@pytest.fixture
+def standing():
+    def standing(user, league, round_obj, points, total_points):
+        return LeagueStanding.objects.create(
+            user=user,
+            league=league,
+            round=round_obj,
+            points=points,
+            total_points=total_points,
+        )
+
+    return standing
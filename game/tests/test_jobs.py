@@ -0,0 +1,82 @@
+import pytest
+
+from django.utils import timezone
+
+from game.models import ProcessingJob
+from game.services.jobs import MAX_ATTEMPTS, claim_jobs, enqueue_jobs, finish_jobs
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def leagues(make_league, users):
+    return [make_league(code, users) for code in ("L1", "L2")]
+
+
+def claimed_leagues(kind, round_obj):
+    return [job.league for job in claim_jobs(kind, round_obj)]
+
+
+def test_completion_waits_for_the_league_draft(make_round, leagues):
+    round_1 = make_round(1)
+    league_ids = [league.id for league in leagues]
+    enqueue_jobs(ProcessingJob.SELECT_PLAYERS, round_1, league_ids)
+    enqueue_jobs(ProcessingJob.COMPLETE_ROUND, round_1, league_ids)
+
+    assert claimed_leagues(ProcessingJob.COMPLETE_ROUND, round_1) == []
+
+    drafted = ProcessingJob.objects.filter(
+        kind=ProcessingJob.SELECT_PLAYERS, league=leagues[0]
+    )
+    finish_jobs(drafted, timezone.now())
+
+    assert claimed_leagues(ProcessingJob.COMPLETE_ROUND, round_1) == [leagues[0]]
+
+
+def test_failed_job_is_retried_until_out_of_attempts(make_round, leagues):
+    round_1 = make_round(1)
+    enqueue_jobs(ProcessingJob.SCORE_LEAGUE, round_1, [leagues[0].id])
+
+    for _ in range(MAX_ATTEMPTS):
+        jobs = claim_jobs(ProcessingJob.SCORE_LEAGUE, round_1)
+        assert [job.league for job in jobs] == [leagues[0]]
+        finish_jobs(jobs, timezone.now(), error=ValueError("boom"))
+
+    assert claim_jobs(ProcessingJob.SCORE_LEAGUE, round_1) == []
+    job = ProcessingJob.objects.get()
+    assert (job.status, job.attempts, job.error) == (
+        ProcessingJob.FAILED,
+        MAX_ATTEMPTS,
+        "boom",
+    )
+
+    # Queueing it again gives it another run
+    enqueue_jobs(ProcessingJob.SCORE_LEAGUE, round_1, [leagues[0].id])
+    assert claimed_leagues(ProcessingJob.SCORE_LEAGUE, round_1) == [leagues[0]]
+
+
+def test_done_jobs_run_again_only_when_requeued(make_round, leagues):
+    round_1 = make_round(1)
+    league_ids = [league.id for league in leagues]
+    enqueue_jobs(ProcessingJob.SCORE_LEAGUE, round_1, league_ids)
+    finish_jobs(claim_jobs(ProcessingJob.SCORE_LEAGUE, round_1), timezone.now())
+
+    assert enqueue_jobs(ProcessingJob.SCORE_LEAGUE, round_1, league_ids) == 0
+    assert claim_jobs(ProcessingJob.SCORE_LEAGUE, round_1) == []
+
+    enqueue_jobs(ProcessingJob.SCORE_LEAGUE, round_1, league_ids, requeue=True)
+    assert claimed_leagues(ProcessingJob.SCORE_LEAGUE, round_1) == leagues
+
+
+def test_claim_limit_and_leagues(make_round, leagues):
+    round_1 = make_round(1)
+    league_ids = [league.id for league in leagues]
+    enqueue_jobs(ProcessingJob.SCORE_LEAGUE, round_1, league_ids)
+
+    assert [
+        job.league for job in claim_jobs(ProcessingJob.SCORE_LEAGUE, round_1, limit=1)
+    ] == leagues[:1]
+    assert [
+        job.league
+        for job in claim_jobs(ProcessingJob.SCORE_LEAGUE, round_1, [leagues[1].id])
+    ] == leagues[1:]
@@ -0,0 +1,132 @@
+import pytest
+
+from game.models import Goal, LeagueStanding
+from game.services.scoring import apply_goal_changes, get_round_goal_counts
+
+pytestmark = pytest.mark.django_db
+
+
+def get_standings(league):
+    return {
+        (standing.user.username, standing.round.number): (
+            standing.points,
+            standing.total_points,
+            standing.position,
+        )
+        for standing in LeagueStanding.objects.filter(league=league).select_related(
+            "user", "round"
+        )
+    }
+
+
+def change_goals(round_obj, player_ids, change):
+    """Run change, which adds or deletes goals, and apply it to the standings"""
+    goal_counts_before = get_round_goal_counts(round_obj, player_ids)
+    change()
+    return apply_goal_changes(round_obj, player_ids, goal_counts_before)
+
+
+@pytest.fixture
+def two_rounds(make_round, make_league, make_match, select, standing, users, players):
+    """A league with two scored rounds: alice leads bob in both"""
+    alice, bob, _ = users
+    league = make_league("L1", [alice, bob])
+    round_1, round_2 = make_round(1), make_round(2)
+    match_1 = make_match(round_1)
+
+    select(alice, league, round_1, players[0])
+    select(bob, league, round_1, players[1])
+    standing(alice, league, round_1, points=1, total_points=1)
+    standing(bob, league, round_1, points=0, total_points=0)
+    standing(alice, league, round_2, points=2, total_points=3)
+    standing(bob, league, round_2, points=2, total_points=2)
+    Goal.objects.create(match=match_1, player=players[0], minute=10)
+    return league, round_1, match_1
+
+
+def test_added_goal_shifts_round_points_and_later_totals(two_rounds, players):
+    league, round_1, match_1 = two_rounds
+
+    changed = change_goals(
+        round_1,
+        {players[1].id},
+        lambda: Goal.objects.create(match=match_1, player=players[1], minute=20),
+    )
+
+    assert changed == {league.id}
+    assert get_standings(league) == {
+        ("alice", 1): (1, 1, 1),
+        ("bob", 1): (1, 1, 2),
+        ("alice", 2): (2, 3, 1),
+        ("bob", 2): (2, 3, 2),
+    }
+
+
+def test_removed_goal_shifts_standings_back(two_rounds, players):
+    league, round_1, match_1 = two_rounds
+
+    change_goals(
+        round_1,
+        {players[0].id},
+        lambda: Goal.objects.filter(match=match_1, player=players[0]).delete(),
+    )
+
+    assert get_standings(league) == {
+        ("alice", 1): (0, 0, 1),
+        ("bob", 1): (0, 0, 2),
+        ("alice", 2): (2, 2, 1),
+        ("bob", 2): (2, 2, 2),
+    }
+
+
+def test_own_goal_changes_nothing(two_rounds, players):
+    league, round_1, match_1 = two_rounds
+    before = get_standings(league)
+
+    changed = change_goals(
+        round_1,
+        {players[1].id},
+        lambda: Goal.objects.create(
+            match=match_1, player=players[1], minute=20, is_own_goal=True
+        ),
+    )
+
+    assert changed == set()
+    assert get_standings(league) == before
+
+
+def test_goal_for_unselected_player_changes_nothing(two_rounds, players):
+    league, round_1, match_1 = two_rounds
+    before = get_standings(league)
+
+    changed = change_goals(
+        round_1,
+        {players[2].id},
+        lambda: Goal.objects.create(match=match_1, player=players[2], minute=20),
+    )
+
+    assert changed == set()
+    assert get_standings(league) == before
+
+
+def test_goal_scores_league_without_standings(
+    make_round, make_league, make_match, select, users, players
+):
+    alice, bob, _ = users
+    league = make_league("L1", [alice, bob])
+    round_1 = make_round(1)
+    match_1 = make_match(round_1)
+    select(alice, league, round_1, players[0])
+    select(bob, league, round_1, players[1])
+
+    changed = change_goals(
+        round_1,
+        {players[0].id},
+        lambda: Goal.objects.create(match=match_1, player=players[0], minute=10),
+    )
+
+    assert changed == {league.id}
+    assert get_standings(league) == {
+        ("alice", 1): (1, 1, 1),
+        ("bob", 1): (0, 0, 2),
+    }
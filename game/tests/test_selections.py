@@ -0,0 +1,77 @@
+import pytest
+
+from django.contrib.auth.models import User
+
+from game.models import LeagueParticipant, SelectionOrder
+from game.services.selections import (
+    build_missing_selection_orders,
+    load_selection_orders,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+def save_order(league, round_obj, users, seed=7):
+    SelectionOrder.objects.bulk_create(
+        SelectionOrder(
+            league=league, round=round_obj, user=user, order=i + 1, seed=seed
+        )
+        for i, user in enumerate(users)
+    )
+
+
+def test_late_joiners_are_added_after_the_order_in_join_order(
+    make_round, make_league, users
+):
+    alice, bob, carol = users
+    league = make_league("L1", [alice, bob])
+    round_1 = make_round(1)
+    save_order(league, round_1, [bob, alice])
+
+    dave = User.objects.create(username="dave")
+    LeagueParticipant.objects.create(league=league, user=carol)
+    LeagueParticipant.objects.create(league=league, user=dave)
+
+    missing = build_missing_selection_orders(
+        round_1, [league], load_selection_orders(round_1, [league])
+    )
+
+    assert [
+        (order.user, order.order, order.seed, order.round)
+        for order in missing[league.id]
+    ] == [(carol, 3, 7, round_1), (dave, 4, 7, round_1)]
+
+
+def test_complete_orders_need_nothing(make_round, make_league, users):
+    round_1 = make_round(1)
+    league = make_league("L1", users)
+    other_league = make_league("L2", users[:1])
+    save_order(league, round_1, users)
+    save_order(other_league, round_1, users[:1])
+
+    leagues = [league, other_league]
+    missing = build_missing_selection_orders(
+        round_1, leagues, load_selection_orders(round_1, leagues)
+    )
+
+    assert missing == {}
+
+
+def test_only_the_league_joined_is_extended(make_round, make_league, users):
+    alice, bob, carol = users
+    round_1 = make_round(1)
+    league = make_league("L1", [alice])
+    other_league = make_league("L2", [alice, carol])
+    save_order(league, round_1, [alice])
+    save_order(other_league, round_1, [alice, carol])
+    LeagueParticipant.objects.create(league=league, user=bob)
+
+    leagues = [league, other_league]
+    missing = build_missing_selection_orders(
+        round_1, leagues, load_selection_orders(round_1, leagues)
+    )
+
+    assert {
+        league_id: [order.user for order in orders]
+        for league_id, orders in missing.items()
+    } == {league.id: [bob]}
@@ -157,7 +157,46 @@ LOGIN_REDIRECT_URL = "/weuro2025_game/"
 LOGOUT_REDIRECT_URL = "/"
 
 # FBR API settings
-FBR_API_BASE_URL = "https://fbrapi.com/"
+# Both can point at a local fbr_stub_server to work offline
+FBR_API_BASE_URL = config("FBR_API_BASE_URL", default="https://fbrapi.com/")
+FBREF_BASE_URL = config("FBREF_BASE_URL", default="https://fbref.com")
+# Connections kept open per host, and how failed requests are retried
+FBR_API_POOL_SIZE = config("FBR_API_POOL_SIZE", default=10, cast=int)
+FBR_API_TIMEOUT = config("FBR_API_TIMEOUT", default=30, cast=float)
+FBR_API_MAX_RETRIES = config("FBR_API_MAX_RETRIES", default=4, cast=int)
+FBR_API_BACKOFF = config("FBR_API_BACKOFF", default=1.0, cast=float)
+FBR_API_MAX_BACKOFF = config("FBR_API_MAX_BACKOFF", default=60.0, cast=float)
+# Requests allowed per host, shared by all threads. A burst lets a few requests
+# through at once after a quiet spell without raising the average rate.
+FBR_API_RATE_LIMITS = {
+    "fbref.com": {
+        "per_minute": config("FBREF_REQUESTS_PER_MINUTE", default=10, cast=float),
+        "burst": config("FBREF_REQUEST_BURST", default=1, cast=int),
+    },
+    "fbrapi.com": {
+        "per_minute": config("FBR_API_REQUESTS_PER_MINUTE", default=20, cast=float),
+        "burst": config("FBR_API_REQUEST_BURST", default=1, cast=int),
+    },
+}
+FBR_API_MAX_WORKERS = config("FBR_API_MAX_WORKERS", default=4, cast=int)
+# Responses are cached on disk (an empty directory turns the cache off), for
+# as many seconds as the endpoint's TTL before they're revalidated
+FBR_API_CACHE_DIR = config("FBR_API_CACHE_DIR", default=str(BASE_DIR / ".cache/fbr"))
+FBR_API_CACHE_MAX_BYTES = config(
+    "FBR_API_CACHE_MAX_BYTES", default=50 * 1024 * 1024, cast=int
+)
+FBR_API_CACHE_TTLS = {
+    "league-standings": 60 * 60,
+    "matches": 10 * 60,
+    "fbref squads": 24 * 60 * 60,
+}
+
+# Live matches are polled this often, from kickoff until this many minutes later
+FBR_LIVE_POLL_SECONDS = config("FBR_LIVE_POLL_SECONDS", default=30, cast=int)
+FBR_LIVE_MATCH_MINUTES = config("FBR_LIVE_MATCH_MINUTES", default=150, cast=int)
+# A match that can't be completed by then is polled this much longer, then
+# left for the admin
+FBR_LIVE_GRACE_MINUTES = config("FBR_LIVE_GRACE_MINUTES", default=60, cast=int)
 
 # CORS settings
 CORS_ALLOWED_ORIGINS = [